@@ -0,0 +1,11 @@
+"""!
+The timing helper shared by the benchmarks in this directory.
+"""
+from timeit import Timer
+
+
+def measure(stmt, number: int) -> float:
+    """!
+    @return the best time of one call of `stmt` in nanoseconds
+    """
+    return min(Timer(stmt).repeat(5, number)) / number * 1e9
@@ -0,0 +1,48 @@
+"""!
+Micro-benchmark of the per-call overhead of ::convert, relative to calling the undecorated function.
+
+Run with `python benchmarks/bench_convert.py` from the repository root.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from _timing import measure  # noqa: E402
+from utils.decorators.convert import convert  # noqa: E402
+
+
+def plain(x, y, z=None):
+    return x
+
+
+def annotated(x: int, y: float, z=None):
+    return x
+
+
+## (name, function, converted function, positional arguments, keyword arguments)
+CASES = [
+    ("no converters, positional", plain, convert(plain), (1, 2), {}),
+    ("two converters, positional", annotated, convert(annotated), (1, 2.0), {}),
+    ("two converters, keywords", annotated, convert(annotated), (1,), {"y": 2.0}),
+]
+
+
+def run(number: int = 100_000) -> dict:
+    """!
+    @return the results, as {case: {"plain": ns, "converted": ns, "overhead": ns}}
+    """
+    results = {}
+    for name, f, converted, args, kwargs in CASES:
+        base = measure(lambda: f(*args, **kwargs), number)
+        decorated = measure(lambda: converted(*args, **kwargs), number)
+        results[name] = {"plain": base, "converted": decorated, "overhead": decorated - base}
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'case':<30}{'plain':>10}{'converted':>12}{'overhead':>12}   (ns per call)")
+    for name, times in run().items():
+        print(
+            f"{name:<30}{times['plain']:>10.0f}{times['converted']:>12.0f}{times['overhead']:>12.0f}"
+        )
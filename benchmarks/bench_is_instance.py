@@ -0,0 +1,57 @@
+"""!
+Micro-benchmark of ::is_instance: the original recursion over `get_origin`/`get_args`
+against the compiled predicates, on the annotations `strict` checks most often.
+
+Run with `python benchmarks/bench_is_instance.py` from the repository root.
+"""
+import sys
+from pathlib import Path
+from typing import Optional, Union, get_args, get_origin
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from _timing import measure  # noqa: E402
+from utils.types_ import NaturalNumber  # noqa: E402
+from utils.types_.is_instance import compile_check, is_instance  # noqa: E402
+
+
+def recursive_is_instance(obj, types) -> bool:
+    """!
+    The implementation of is_instance before predicates were compiled
+    """
+    if get_origin(types) is Union:
+        return recursive_is_instance(obj, get_args(types))
+    return isinstance(obj, types)
+
+
+## (name, object, annotation)
+CASES = [
+    ("int", 1, int),
+    ("Union[int, str]", "x", Union[int, str]),
+    ("Optional[float]", None, Optional[float]),
+    ("NaturalNumber", 5, NaturalNumber),
+    ("Union[NaturalNumber, str]", "x", Union[NaturalNumber, str]),
+]
+
+
+def run(number: int = 200_000) -> dict:
+    """!
+    @return the results, as {case: {implementation: nanoseconds per call}}
+    """
+    results = {}
+    for name, obj, annotation in CASES:
+        predicate = compile_check(annotation)
+        results[name] = {
+            "recursive": measure(lambda: recursive_is_instance(obj, annotation), number),
+            "is_instance": measure(lambda: is_instance(obj, annotation), number),
+            "compiled": measure(lambda: predicate(obj), number),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'annotation':<28}{'recursive':>12}{'is_instance':>14}{'compiled':>12}   (ns per call)")
+    for name, times in run().items():
+        print(
+            f"{name:<28}{times['recursive']:>12.0f}{times['is_instance']:>14.0f}{times['compiled']:>12.0f}"
+        )
@@ -0,0 +1,57 @@
+"""!
+Micro-benchmark of ::template instantiations reading their parameters through `self`,
+compared to specialized instantiations (`specialize=True`) that have them compiled into their methods.
+
+Run with `python benchmarks/bench_template.py` from the repository root.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from _timing import measure  # noqa: E402
+from utils.decorators.template import template  # noqa: E402
+
+
+class Kernel:
+    def dot(self, xs):
+        acc = 0.0
+        for i in range(self.size):
+            acc += xs[i] * self.scale
+        return acc
+
+    def clamp(self, x):
+        return self.low if x < self.low else self.high if x > self.high else x
+
+
+Plain = template("size", "scale", "low", "high")(Kernel)
+Specialized = template("size", "scale", "low", "high", specialize=True)(Kernel)
+PARAMS = {"size": 64, "scale": 0.5, "low": -1.0, "high": 1.0}
+DATA = [float(i % 7) for i in range(64)]
+
+## (name, statement using an instance `k`)
+CASES = [
+    ("dot product over 64 elements", lambda k: k.dot(DATA)),
+    ("clamp one value", lambda k: k.clamp(0.5)),
+]
+
+
+def run(number: int = 20_000) -> dict:
+    """!
+    @return the results, as {case: {"attributes": ns, "specialized": ns, "speedup": factor}}
+    """
+    plain, specialized = Plain(**PARAMS)(), Specialized(**PARAMS)()
+    results = {}
+    for name, stmt in CASES:
+        base = measure(lambda: stmt(plain), number)
+        fast = measure(lambda: stmt(specialized), number)
+        results[name] = {"attributes": base, "specialized": fast, "speedup": base / fast}
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'case':<32}{'attributes':>12}{'specialized':>13}{'speedup':>9}   (ns per call)")
+    for name, times in run().items():
+        print(
+            f"{name:<32}{times['attributes']:>12.0f}{times['specialized']:>13.0f}{times['speedup']:>8.2f}x"
+        )
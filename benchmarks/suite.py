@@ -0,0 +1,239 @@
+"""!
+Benchmark suite for the decorators in `utils.decorators`, the cache and `Converting`.
+
+It measures
+- the time per call of every decorator, next to the undecorated function,
+- overload dispatch as the number of implementations grows,
+- cache hits and misses as the cache grows,
+- the memory per instance of `auto_slots` classes,
+and includes the results of the other benchmarks in this directory.
+
+The results are written as JSON, as {"group/case": {"value": number, "unit": "ns" or "bytes"}},
+where lower is always better. Given a baseline (a results file of an earlier run), every result that got worse
+by more than the tolerance is reported as a regression, and the exit code is 1.
+
+Run from the repository root:
+```sh
+python benchmarks/suite.py --output results.json --baseline benchmarks/baseline.json
+python benchmarks/suite.py --output benchmarks/baseline.json  # update the baseline
+```
+Times depend on the machine, so a baseline should come from the machine it is compared on.
+"""
+import argparse
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import bench_convert  # noqa: E402
+from _timing import measure  # noqa: E402
+import bench_is_instance  # noqa: E402
+import bench_template  # noqa: E402
+from utils.cache import cached  # noqa: E402
+from utils.converting_match import Converting, pre_made_converters  # noqa: E402
+from utils.decorators import auto_slots, convert, overload, strict, template  # noqa: E402
+from utils.decorators.contracts import contract, postcondition, precondition  # noqa: E402
+from utils.decorators.factory import param_factory  # noqa: E402
+
+## regressions smaller than this many nanoseconds (or bytes) are noise
+MIN_DIFFERENCE = 20.0
+
+
+def _plain(x, y=1):
+    return x
+
+
+def _annotated(x: int, y: int = 1) -> int:
+    return x
+
+
+def decorator_overhead(number: int) -> dict:
+    """!
+    @return the time per call of each decorator and of the undecorated function
+    """
+
+    @overload
+    def overloaded(x: int, y: int = 1):
+        return x
+
+    @template("n")
+    class Templated:
+        pass
+
+    @cached
+    def cached_f(x, y=1):
+        return x
+
+    miss_keys = iter(range(10**9))
+
+    @cached(maxsize=1024)
+    def bounded(x):
+        return x
+
+    def match_digits(s):
+        match Converting(s):
+            case pre_made_converters.Digits(x):
+                return x
+
+    cases = {
+        "undecorated": lambda: _plain(1),
+        "strict": (lambda f: lambda: f(1))(strict(_annotated)),
+        "strict compiled": (lambda f: lambda: f(1))(strict(compiled=True)(_annotated)),
+        "overload": lambda: overloaded(1),
+        "convert": (lambda f: lambda: f(1))(convert(_annotated)),
+        "param_factory, passed": (lambda f: lambda: f(1, 2))(param_factory("y", int)(_plain)),
+        "param_factory, made": (lambda f: lambda: f(1))(param_factory("y", int)(_plain)),
+        "param_factory, pooled": (lambda f: lambda: f(1))(param_factory("y", int, pool=4)(_plain)),
+        "precondition": (lambda f: lambda: f(1))(precondition("x", ("x",), bool)(_plain)),
+        "postcondition": (lambda f: lambda: f(1))(postcondition("r", bool)(_plain)),
+        "five stacked contracts": (lambda f: lambda: f(1))(
+            contract(pre=[("x", ("x",), bool)] * 3, post=[("r", bool)] * 2)(_plain)
+        ),
+        "template instantiation, cached": lambda: Templated(n=3),
+        "cached, hit": lambda: cached_f(1),
+        "cached, miss with eviction": lambda: bounded(next(miss_keys)),
+        "Converting match": lambda: match_digits("12"),
+    }
+    return {name: measure(stmt, number) for name, stmt in cases.items()}
+
+
+def overload_scaling(number: int, counts=(1, 2, 4, 8, 16)) -> dict:
+    """!
+    @return the time of a call dispatched to the last of n overloads, by n
+    """
+    results = {}
+    for n in counts:
+        classes = [type(f"T{i}", (), {}) for i in range(n)]
+        namespace = {"overload": overload}
+        for i, cls in enumerate(classes):
+            namespace[f"T{i}"] = cls
+            exec(f"@overload\ndef f_{n}(x: T{i}):\n    return {i}", namespace)
+        f = namespace[f"f_{n}"]
+        last = classes[-1]()
+        results[f"{n} overloads"] = measure(lambda: f(last), number)
+    return results
+
+
+def cache_scaling(number: int, sizes=(100, 10_000, 100_000)) -> dict:
+    """!
+    @return the time of hits in a full cache, and of misses evicting from it, by cache size
+    """
+    results = {}
+    for size in sizes:
+        for policy in ("lru", "lfu"):
+
+            @cached(maxsize=size, policy=policy)
+            def f(x):
+                return x
+
+            for i in range(size):
+                f(i)
+            keys = iter(range(size, 10**9))
+            results[f"{policy} {size} entries, hit"] = measure(lambda: f(size // 2), number)
+            results[f"{policy} {size} entries, miss"] = measure(lambda: f(next(keys)), number)
+    return results
+
+
+def slots_memory(count: int = 10_000) -> dict:
+    """!
+    @return the bytes per instance of a small class with and without `auto_slots`
+    """
+
+    class Point:
+        def __init__(self, x, y, z):
+            self.x = x
+            self.y = y
+            self.z = z
+
+    Slotted = auto_slots(Point)
+    results = {}
+    for name, cls in (("dict", Point), ("auto_slots", Slotted)):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [cls(None, None, None) for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        # the list holding them takes a pointer per instance
+        results[f"{name} instance"] = (after - before) / len(instances) - 8
+    report = auto_slots.report(Slotted)
+    results["auto_slots.report, dict"] = report.dict_bytes
+    results["auto_slots.report, slotted"] = report.slots_bytes
+    return results
+
+
+def run(quick: bool = False) -> dict:
+    """!
+    Runs all benchmarks.
+
+    @param quick whether to make fewer calls per measurement (for a rough check)
+    @return the results, as {"group/case": {"value": number, "unit": unit}}
+    """
+    scale = 10 if quick else 1
+    results = {}
+
+    def add(group: str, values: dict, unit: str = "ns"):
+        for case, value in values.items():
+            results[f"{group}/{case}"] = {"value": round(value, 1), "unit": unit}
+
+    add("decorators", decorator_overhead(100_000 // scale))
+    add("overload dispatch", overload_scaling(100_000 // scale))
+    add("cache", cache_scaling(100_000 // scale))
+    add("memory", slots_memory(), "bytes")
+    for name, times in bench_is_instance.run(100_000 // scale).items():
+        add(f"is_instance/{name}", times)
+    for name, times in bench_convert.run(100_000 // scale).items():
+        add(f"convert/{name}", {k: v for k, v in times.items() if k != "overhead"})
+    for name, times in bench_template.run(10_000 // scale).items():
+        add(f"template/{name}", {k: v for k, v in times.items() if k != "speedup"})
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """!
+    @param tolerance the relative slowdown that is still accepted, like 0.25 for 25%
+    @return (name, baseline value, new value) for every result that got worse than the tolerance allows
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        new, before = result["value"], old["value"]
+        if new > before * (1 + tolerance) and new - before > MIN_DIFFERENCE:
+            regressions.append((name, before, new))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip("!\n "))
+    parser.add_argument("--output", help="where to write the results as JSON")
+    parser.add_argument("--baseline", help="a results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="accepted relative slowdown (default 0.25)")
+    parser.add_argument("--quick", action="store_true", help="make fewer calls per measurement")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick)
+    width = max(map(len, results))
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result['value']:>12.1f} {result['unit']}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text())
+    regressions = compare(results, baseline, args.tolerance)
+    if not regressions:
+        print(f"\nno regressions against {args.baseline}")
+        return 0
+    print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+    for name, before, new in regressions:
+        print(f"  {name}: {before:.1f} -> {new:.1f} ({new / before - 1:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
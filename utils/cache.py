@@ -1,10 +1,26 @@
 """!
 Adds a cache decorator
 """
+import atexit
+import os
+import pickle
+import sqlite3
+import warnings
+from asyncio import ensure_future, get_running_loop, shield
+from collections import OrderedDict
+from concurrent.futures import Future
 from enum import Enum
-from functools import wraps
+from functools import wraps, partial
+from hashlib import blake2b
+from io import BytesIO
+from inspect import Parameter, iscoroutinefunction, signature
+from queue import Empty, SimpleQueue
+from sys import getsizeof
+from threading import Event, Lock, Thread, local
+from time import monotonic, perf_counter, time
+from typing import Any, Callable, Hashable, Iterable, NamedTuple, Optional
 
-__all__ = ["cached", "CacheMissException", "Policy"]
+__all__ = ["cached", "CacheMissException", "Policy", "CacheInfo", "CacheTier", "SQLiteTier"]
 
 
 class CacheMissException(Exception):
@@ -29,30 +45,1144 @@ class Policy(Enum):
     only_cache = "only cache"
 
 
-def cached(f):
+class CacheInfo(NamedTuple):
+    """!
+    The statistics of a ::cached function, as returned by its `cache_info()`
+    """
+
+    ## the number of calls served from the cache (including those that waited for a concurrent call computing the value)
+    hits: int
+    ## the number of calls of the decorated function
+    misses: int
+    ## the number of calls with `Policy.only_cache` that found nothing
+    only_cache_misses: int
+    ## the number of results removed to respect the bounds (or because they expired)
+    evictions: int
+    ## the number of results currently cached in memory
+    currsize: int
+    ## the maximum number of results, or None if the number is not bounded
+    maxsize: Optional[int]
+    ## the total number of seconds spent serving hits (including waiting), only measured with `timing` or `metrics`
+    hit_time: float
+    ## the total number of seconds spent computing (and storing) misses, only measured with `timing` or `metrics`
+    miss_time: float
+
+
+## @cond
+_MISSING = object()
+
+
+class _Store:
+    """!
+    An unbounded store; also the base class of the bounded stores.
+
+    Subclasses only decide which key to evict next (`_victim`) and what a hit does to the
+    eviction order (`_touch`); size, byte and expiry accounting all live here.
+    All operations are O(1) (amortized, for the expiry queue).
+    """
+
+    def __init__(
+        self,
+        maxsize: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = getsizeof,
+        budget: Optional["_ByteBudget"] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # shared with the other segments of a thread-safe cache, which then bounds their total size
+        self.budget = budget
+        self.evictions = 0
+        self.nbytes = 0
+        self._data = self._make_data()
+        # key -> deadline; since ttl is the same for every entry, insertion order is expiry order.
+        # Ordered dicts, since a plain dict keeps the slots of removed keys at its front until it resizes,
+        # so finding the first key would take longer with every removal
+        self._deadlines = OrderedDict()
+        # key -> size in bytes, only kept when max_bytes is set
+        self._sizes = {}
+
+    def _make_data(self):
+        return {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.lookup(key) is not _MISSING
+
+    def lookup(self, key: Hashable) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            return _MISSING
+        if self.ttl is not None and self._deadlines[key] <= monotonic():
+            self.remove(key)
+            self.evictions += 1
+            return _MISSING
+        self._touch(key)
+        return value
+
+    def store(self, key: Hashable, value: Any):
+        if key in self._data:
+            self.remove(key)
+        if self.ttl is not None:
+            self._expire()
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if (self.maxsize is not None and self.maxsize <= 0) or (
+            self.max_bytes is not None and size > self.max_bytes
+        ):
+            return
+        # evict before inserting, so that a new entry is never its own victim
+        while self._data and self._full(size):
+            self.remove(self._victim())
+            self.evictions += 1
+        if self.budget is not None and not self.budget.take(size, self):
+            return
+        if self.ttl is not None:
+            self._deadlines[key] = monotonic() + self.ttl
+        if self.max_bytes is not None:
+            self._sizes[key] = size
+            self.nbytes += size
+        self._data[key] = value
+        self._inserted(key)
+
+    def remove(self, key: Hashable):
+        del self._data[key]
+        self._removed(key)
+        if self.ttl is not None:
+            del self._deadlines[key]
+        if self.max_bytes is not None:
+            size = self._sizes.pop(key)
+            self.nbytes -= size
+            if self.budget is not None:
+                self.budget.give_back(size)
+
+    def discard(self, key: Hashable):
+        if key in self._data:
+            self.remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self._deadlines.clear()
+        self._sizes.clear()
+        if self.budget is not None:
+            self.budget.give_back(self.nbytes)
+        self.nbytes = 0
+        self.evictions = 0
+        self._cleared()
+
+    def _full(self, size: int) -> bool:
+        nbytes = self.nbytes if self.budget is None else self.budget.nbytes
+        return (self.maxsize is not None and len(self._data) >= self.maxsize) or (
+            self.max_bytes is not None and nbytes + size > self.max_bytes
+        )
+
+    def _expire(self):
+        now = monotonic()
+        expired = []
+        for key, deadline in self._deadlines.items():
+            if deadline > now:
+                break
+            expired.append(key)
+        for key in expired:
+            self.remove(key)
+            self.evictions += 1
+
+    def _victim(self) -> Hashable:
+        return next(iter(self._data))
+
+    def _touch(self, key: Hashable):
+        pass
+
+    def _inserted(self, key: Hashable):
+        pass
+
+    def _removed(self, key: Hashable):
+        pass
+
+    def _cleared(self):
+        pass
+
+
+class _FIFOStore(_Store):
+    """!
+    Evicts the oldest entry.
+    """
+
+    def _make_data(self):
+        return OrderedDict()
+
+
+class _LRUStore(_Store):
+    """!
+    Evicts the least recently used entry.
+    """
+
+    def _make_data(self):
+        return OrderedDict()
+
+    def _touch(self, key: Hashable):
+        self._data.move_to_end(key)
+
+
+class _LFUStore(_Store):
+    """!
+    Evicts the least frequently used entry (the oldest one among those with the same count).
+
+    Keeps a bucket of keys per use count and the smallest non-empty count,
+    so that both hits and evictions are O(1); only evicting again before the next insertion
+    (to free enough bytes) after emptying the smallest bucket rescans the distinct counts.
+    """
+
+    def _make_data(self):
+        self._counts = {}
+        self._buckets = {}
+        # None if it has to be looked up again
+        self._min_count = None
+        return {}
+
+    def _touch(self, key: Hashable):
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._bucket(count + 1)[key] = None
+
+    def _bucket(self, count: int) -> OrderedDict:
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = OrderedDict()
+        return bucket
+
+    def _inserted(self, key: Hashable):
+        self._counts[key] = 1
+        self._bucket(1)[key] = None
+        self._min_count = 1
+
+    def _removed(self, key: Hashable):
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = None
+
+    def _cleared(self):
+        self._counts.clear()
+        self._buckets.clear()
+        self._min_count = None
+
+    def _victim(self) -> Hashable:
+        if self._min_count is None:
+            self._min_count = min(self._buckets)
+        return next(iter(self._buckets[self._min_count]))
+
+
+_STORES = {"lru": _LRUStore, "lfu": _LFUStore, "fifo": _FIFOStore}
+
+
+class _ByteBudget:
+    """!
+    The `max_bytes` of a thread-safe cache, shared by the stores of all its segments,
+    so that splitting the cache into segments doesn't change which values fit.
+
+    A store evicts its own entries first; if that isn't enough, it evicts from the other segments
+    whose locks are free (never waiting for one, since it already holds its own).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.lock = Lock()
+        ## (store, lock) of every segment
+        self.members = []
+
+    def _reserve(self, size: int) -> bool:
+        with self.lock:
+            if self.nbytes + size > self.max_bytes:
+                return False
+            self.nbytes += size
+            return True
+
+    def take(self, size: int, store: _Store) -> bool:
+        """!
+        Reserves `size` bytes for a new entry of `store` (whose segment's lock is held).
+        @return whether they could be freed, else the entry isn't stored
+        """
+        if self._reserve(size):
+            return True
+        for other, lock in self.members:
+            if other is store or not lock.acquire(blocking=False):
+                continue
+            try:
+                while other._data and self.nbytes + size > self.max_bytes:
+                    other.remove(other._victim())
+                    other.evictions += 1
+            finally:
+                lock.release()
+            if self._reserve(size):
+                return True
+        return False
+
+    def give_back(self, size: int):
+        with self.lock:
+            self.nbytes -= size
+
+
+def _make_store(maxsize, policy, ttl, max_bytes, sizeof, budget=None) -> _Store:
+    if policy not in _STORES:
+        raise ValueError(
+            f"unknown eviction policy {policy!r}, expected one of {', '.join(map(repr, _STORES))}"
+        )
+    if maxsize is None and ttl is None and max_bytes is None:
+        return _Store()
+    return _STORES[policy](maxsize, ttl, max_bytes, sizeof, budget)
+
+
+## @endcond
+
+
+class CacheTier:
+    """!
+    The interface of a second cache tier behind the in-memory store of ::cached.
+
+    A tier is shared by all functions using it, so every operation gets the namespace
+    of the cached function (its qualified name) along with the key.
+    """
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        """!
+        @param namespace the namespace of the cached function
+        @param key the argument key
+        @return the cached value
+        @throws KeyError if there is no (valid) value for the key
+        """
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: Hashable, value: Any):
+        """!
+        @param namespace the namespace of the cached function
+        @param key the argument key
+        @param value the value to store
+        """
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: Hashable):
+        """!
+        Removes a key; missing keys are ignored.
+        @param namespace the namespace of the cached function
+        @param key the argument key
+        """
+        raise NotImplementedError
+
+    def clear(self, namespace: str):
+        """!
+        Removes every key of a namespace.
+        @param namespace the namespace of the cached function
+        """
+        raise NotImplementedError
+
+
+class SQLiteTier(CacheTier):
+    """!
+    A cache tier stored in a local SQLite database file.
+
+    Since the file is shared, results computed by one process are served to every other
+    process using the same file, and they survive restarts. Keys and values are serialized
+    with `serializer` (anything with `dumps` and `loads`, like `pickle` or `json`);
+    keys therefore have to serialize the same way in every process to be found again.
+
+    With `write_behind`, writes are queued and performed in batches by a background thread,
+    so they stay off the caller's latency path; call ::flush to wait for them.
+    Reads are always synchronous (read-through).
+
+    Connections are opened per thread and reopened after a fork, so a tier can be created
+    before forking worker processes.
+
+    ## Example:
+    ```py
+    tier = SQLiteTier("/var/cache/app/lookups.sqlite", write_behind=True)
+
+    @cached(maxsize=1024, tier=tier)
+    def lookup(name):
+        ...
+    ```
+    """
+
+    ## The most writes a write-behind thread performs in one transaction
+    batch_size = 256
+
+    def __init__(
+        self,
+        path: str,
+        serializer: Any = pickle,
+        ttl: Optional[float] = None,
+        write_behind: bool = False,
+        timeout: float = 30.0,
+    ):
+        """!
+        @param path the path of the database file
+        @param serializer a module or object with `dumps` and `loads` functions
+        @param ttl the number of seconds a stored value stays valid
+        @param write_behind whether to write in a background thread
+        @param timeout how long to wait for another process' lock on the database
+        """
+        self.path = path
+        self.serializer = serializer
+        self.ttl = ttl
+        self.write_behind = write_behind
+        self.timeout = timeout
+        self._pid = None
+        self._lock = Lock()
+        self._reset()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key BLOB NOT NULL, value BLOB NOT NULL, expires REAL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # connections and threads don't survive a fork, so everything is per process
+        self._pid = os.getpid()
+        self._local = local()
+        self._queue = SimpleQueue()
+        self._idle = Event()
+        self._idle.set()
+        self._writer = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _dump_key(self, key: Hashable) -> bytes:
+        """!
+        Serializes a key, so that equal keys always give the same bytes.
+
+        Pickle refers back to objects it has already written in the same call, which makes the bytes
+        depend on which of the equal parts of a key are the same object; without that memo they don't.
+        """
+        if self.serializer is not pickle:
+            return self.serializer.dumps(key)
+        buffer = BytesIO()
+        pickler = pickle.Pickler(buffer, protocol=4)
+        # keys built by cached are never recursive, which is all the memo is needed for
+        pickler.fast = True
+        pickler.dump(key)
+        return buffer.getvalue()
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, self._dump_key(key)),
+            )
+            .fetchone()
+        )
+        if row is None or (row[1] is not None and row[1] <= time()):
+            raise KeyError(key)
+        return self.serializer.loads(row[0])
+
+    def set(self, namespace: str, key: Hashable, value: Any):
+        row = (
+            namespace,
+            self._dump_key(key),
+            self.serializer.dumps(value),
+            None if self.ttl is None else time() + self.ttl,
+        )
+        if not self.write_behind:
+            with self._connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", row)
+            return
+        self._connection()
+        with self._lock:
+            self._idle.clear()
+            self._queue.put(row)
+            if self._writer is None:
+                self._writer = Thread(target=self._write_behind, daemon=True)
+                self._writer.start()
+
+    def delete(self, namespace: str, key: Hashable):
+        self.flush()
+        with self._connection() as conn:
+            conn.execute(
+                "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, self._dump_key(key)),
+            )
+
+    def clear(self, namespace: str):
+        self.flush()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def flush(self):
+        """!
+        Waits until every queued write-behind write is stored.
+        """
+        if self._pid == os.getpid():
+            self._idle.wait()
+
+    def _write_behind(self):
+        while True:
+            rows = [self._queue.get()]
+            try:
+                while len(rows) < self.batch_size:
+                    rows.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            try:
+                with self._connection() as conn:
+                    conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                warnings.warn(f"could not write to cache tier {self.path!r}: {e}", RuntimeWarning)
+            with self._lock:
+                if self._queue.empty():
+                    self._idle.set()
+
+
+## @cond
+class _Tier:
+    """!
+    A ::CacheTier bound to the namespace of one cached function.
+
+    Tiers may block on I/O, so they are never used while holding a segment's lock
+    (nor, for coroutine functions, on the event loop); values found in the tier are copied
+    into the in-memory store, and new values are written to both.
+    """
+
+    __slots__ = ("tier", "namespace")
+
+    def __init__(self, tier: CacheTier, namespace: str):
+        self.tier = tier
+        self.namespace = namespace
+
+    def get(self, key: Hashable) -> Any:
+        try:
+            return self.tier.get(self.namespace, key)
+        except KeyError:
+            return _MISSING
+
+    def set(self, key: Hashable, value: Any):
+        self.tier.set(self.namespace, key, value)
+
+    def delete(self, key: Hashable):
+        self.tier.delete(self.namespace, key)
+
+    def clear(self):
+        self.tier.clear(self.namespace)
+
+
+def _order(value: Any) -> tuple:
+    try:
+        return 0, pickle.dumps(value)
+    except Exception:
+        return 1, repr(value).encode()
+
+
+def _sorted(items: Iterable) -> tuple:
+    """!
+    @return the items as a sorted tuple, falling back to sorting by their pickled (or repr) form
+    if they can't be compared; unlike a frozenset, it pickles the same way in every process,
+    where the hashes of strings differ, so keys of dicts and sets are found again in a ::CacheTier
+    """
+    items = list(items)
+    try:
+        return tuple(sorted(items))
+    except TypeError:
+        return tuple(sorted(items, key=_order))
+
+
+def _freeze(value: Any, hash_buffers: bool) -> Hashable:
+    """!
+    Turns an unhashable argument into a hashable key with the same content;
+    containers become tagged tuples, buffers (if `hash_buffers`) a digest of their content.
+    """
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        pass
+    if isinstance(value, (tuple, list)):
+        return type(value), tuple(_freeze(v, hash_buffers) for v in value)
+    if isinstance(value, dict):
+        return dict, _sorted((k, _freeze(v, hash_buffers)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return set, _sorted(value)
+    if hash_buffers:
+        try:
+            view = memoryview(value)
+        except TypeError:
+            pass
+        else:
+            # hashing reads the buffer in place, only non-contiguous buffers have to be copied
+            data = view if view.c_contiguous else view.tobytes()
+            return type(value), view.format, view.shape, blake2b(data).digest()
+    raise TypeError(
+        f"can't build a cache key from an argument of type {type(value).__qualname__!r}"
+        + ("" if hash_buffers else " (use hash_buffers=True to hash buffers by content)")
+    )
+
+
+def _key_maker(f: Callable, hash_buffers: bool) -> Callable[[tuple, dict], Hashable]:
+    """!
+    Builds the function computing the cache key of an argument list of `f`.
+
+    The arguments are bound to the signature of `f` with defaults applied,
+    so every way of passing the same arguments gives the same key. Calls without keyword arguments
+    skip the binding, and hashable keys are used as they are.
+    """
+    try:
+        sig = signature(f)
+    except (TypeError, ValueError):
+        sig = None
+    if sig is None:
+
+        def make_key(args: tuple, kwargs: dict) -> Hashable:
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+                return key
+            except TypeError:
+                return _freeze(key, hash_buffers)
+
+        return make_key
+
+    params = tuple(sig.parameters.values())
+    positional = tuple(
+        p for p in params if p.kind in {Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD}
+    )
+    n_positional = len(positional)
+    n_required = sum(p.default is Parameter.empty for p in positional)
+    defaults = tuple(p.default for p in positional)
+    var_positional = any(p.kind == Parameter.VAR_POSITIONAL for p in params)
+    var_keyword = [p.name for p in params if p.kind == Parameter.VAR_KEYWORD]
+    keyword_only = [p for p in params if p.kind == Parameter.KEYWORD_ONLY]
+    # what binding would add after the positional parameters in a call without keyword arguments
+    tail = tuple(p.default for p in keyword_only) + (((),) if var_keyword else ())
+    fast = all(p.default is not Parameter.empty for p in keyword_only)
+
+    def make_key(args: tuple, kwargs: dict) -> Hashable:
+        n = len(args)
+        if not kwargs and fast and n >= n_required and (var_positional or n <= n_positional):
+            key = args[:n_positional] + defaults[n:]
+            if var_positional:
+                key += (args[n_positional:],)
+            if tail:
+                key += tail
+        else:
+            try:
+                bound = sig.bind(*args, **kwargs)
+            except TypeError:
+                # the call itself will fail, the key doesn't matter
+                key = (args, tuple(kwargs.items()))
+            else:
+                bound.apply_defaults()
+                arguments = bound.arguments
+                for name in var_keyword:
+                    arguments[name] = tuple(sorted(arguments[name].items()))
+                key = tuple(arguments.values())
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            return _freeze(key, hash_buffers)
+
+    return make_key
+
+
+class _Segment:
+    """!
+    One stripe of a cache: a store, the calls currently computing a value for one of its keys,
+    the statistics of its keys, and the lock guarding all of them in a thread-safe cache.
+    """
+
+    __slots__ = (
+        "lock",
+        "store",
+        "tier",
+        "pending",
+        "hits",
+        "misses",
+        "only_cache_misses",
+        "hit_time",
+        "miss_time",
+    )
+
+    def __init__(self, store: _Store, tier: Optional[_Tier] = None):
+        self.lock = Lock()
+        self.store = store
+        # shared by all segments, and not guarded by the lock
+        self.tier = tier
+        self.pending = {}
+        self.reset()
+
+    def reset(self):
+        self.hits = self.misses = self.only_cache_misses = 0
+        self.hit_time = self.miss_time = 0.0
+
+
+def _make_segments(make_store, maxsize, max_bytes, stripes, tier) -> list:
+    if stripes < 1:
+        raise ValueError(f"stripes must be at least 1, got {stripes}")
+    if maxsize is not None and maxsize > 0:
+        stripes = min(stripes, maxsize)
+
+    def share(bound, i):
+        # the first `bound % stripes` segments get one more, so that the shares add up to the bound
+        return None if bound is None else bound // stripes + (i < bound % stripes)
+
+    # the byte budget is shared rather than split, so that every value up to max_bytes still fits
+    budget = None if max_bytes is None or stripes == 1 else _ByteBudget(max_bytes)
+    segments = [_Segment(make_store(share(maxsize, i), max_bytes, budget), tier) for i in range(stripes)]
+    if budget is not None:
+        budget.members = [(segment.store, segment.lock) for segment in segments]
+    return segments
+
+
+def _count_hit(segment: _Segment, start: float, timed: bool) -> float:
+    """!
+    Counts a hit in `segment` (under its lock, if it has to be held).
+    @return the seconds since `start`, or 0.0 if not `timed`
+    """
+    elapsed = perf_counter() - start if timed else 0.0
+    segment.hits += 1
+    segment.hit_time += elapsed
+    return elapsed
+
+
+def _count_miss(segment: _Segment, start: float, timed: bool) -> float:
+    elapsed = perf_counter() - start if timed else 0.0
+    segment.misses += 1
+    segment.miss_time += elapsed
+    return elapsed
+
+
+def _report(metrics: Optional[Callable], event: str, elapsed: float):
+    # never called while holding a segment's lock, since the callback may use the cache itself
+    if metrics is not None:
+        metrics(event, elapsed)
+
+
+def _only_cache_miss(metrics: Optional[Callable]) -> CacheMissException:
+    _report(metrics, "only_cache_miss", 0.0)
+    return CacheMissException("argument list was not cached")
+
+
+def _from_tier(segment: _Segment, key: Hashable, res: Any, start: float, timed: bool) -> float:
+    """!
+    Copies a value found in the tier into the in-memory store, and counts the hit.
+    @return the seconds the hit took
+    """
+    with segment.lock:
+        segment.store.store(key, res)
+        return _count_hit(segment, start, timed)
+
+
+def _single_flight(
+    segment: _Segment,
+    key: Hashable,
+    policy: Policy,
+    compute: Callable[[], Any],
+    timed: bool,
+    metrics: Optional[Callable],
+):
+    """!
+    Looks `key` up in `segment` (and its tier), making sure only one thread at a time computes a missing value;
+    the others wait for its result (or its exception), and count as hits.
+    """
+    start = perf_counter() if timed else 0.0
+    tier = segment.tier
+    with segment.lock:
+        res = segment.store.lookup(key)
+        found = res is not _MISSING
+        if found:
+            elapsed = _count_hit(segment, start, timed)
+        elif policy is not Policy.only_cache:
+            future = segment.pending.get(key)
+            leader = future is None
+            if leader:
+                future = segment.pending[key] = Future()
+    if found:
+        _report(metrics, "hit", elapsed)
+        return res
+    if policy is Policy.only_cache:
+        res = _MISSING if tier is None else tier.get(key)
+        if res is _MISSING:
+            with segment.lock:
+                segment.only_cache_misses += 1
+            raise _only_cache_miss(metrics)
+        _report(metrics, "hit", _from_tier(segment, key, res, start, timed))
+        return res
+    if not leader:
+        res = future.result()
+        with segment.lock:
+            elapsed = _count_hit(segment, start, timed)
+        _report(metrics, "hit", elapsed)
+        return res
+    try:
+        res = _MISSING if tier is None else tier.get(key)
+        computed = res is _MISSING
+        if computed:
+            res = compute()
+    except BaseException as e:
+        with segment.lock:
+            del segment.pending[key]
+        future.set_exception(e)
+        raise
+    with segment.lock:
+        segment.store.store(key, res)
+        del segment.pending[key]
+        elapsed = (_count_miss if computed else _count_hit)(segment, start, timed)
+    future.set_result(res)
+    if computed and tier is not None:
+        tier.set(key, res)
+    _report(metrics, "miss" if computed else "hit", elapsed)
+    return res
+
+
+async def _in_executor(function: Callable, *args) -> Any:
+    # the tier's I/O would block the event loop
+    return await get_running_loop().run_in_executor(None, partial(function, *args))
+
+
+async def _fill(
+    segment: _Segment,
+    key: Hashable,
+    call: Callable[[], Any],
+    shared: bool,
+    timed: bool,
+    metrics: Optional[Callable],
+) -> Any:
+    """!
+    Awaits `call()` and stores the result.
+
+    @param shared whether this is the task registered in `segment.pending` that concurrent awaiters share,
+    which looks the key up in the tier first; otherwise (with `Policy.no_cache`) `segment.pending` is left alone,
+    since it may hold another call's task for the key
+    """
+    start = perf_counter() if timed else 0.0
+    tier = segment.tier
+    try:
+        res = _MISSING if tier is None or not shared else await _in_executor(tier.get, key)
+        computed = res is _MISSING
+        if computed:
+            res = await call()
+    except BaseException:
+        if shared:
+            with segment.lock:
+                segment.pending.pop(key, None)
+        raise
+    with segment.lock:
+        segment.store.store(key, res)
+        if shared:
+            segment.pending.pop(key, None)
+        elapsed = (_count_miss if computed else _count_hit)(segment, start, timed)
+    if computed and tier is not None:
+        await _in_executor(tier.set, key, res)
+    _report(metrics, "miss" if computed else "hit", elapsed)
+    return res
+
+
+def _cached_coroutine(
+    f: Callable, segments: list, timed: bool, metrics: Optional[Callable], make_key: Callable
+) -> Callable:
+    """!
+    The coroutine function version of ::cached: caches the awaited result instead of the coroutine,
+    and lets concurrent awaiters of the same key share one task (all but the first counting as hits).
+    """
+
+    @wraps(f)
+    async def wrapper(*args, __cache_policy__=Policy.try_cache, **kwargs):
+        """!
+        @param __cache_policy__ a Policy enum member
+        """
+        all_args = make_key(args, kwargs)
+        segment = segments[hash(all_args) % len(segments)]
+        call = partial(f, *args, **kwargs)
+        if __cache_policy__ is Policy.no_cache:
+            return await _fill(segment, all_args, call, False, timed, metrics)
+        start = perf_counter() if timed else 0.0
+        with segment.lock:
+            res = segment.store.lookup(all_args)
+            found = res is not _MISSING
+            if found:
+                elapsed = _count_hit(segment, start, timed)
+            elif __cache_policy__ is not Policy.only_cache:
+                task = segment.pending.get(all_args)
+                # tasks can't be shared between the event loops of different threads
+                shared = task is not None and task.get_loop() is get_running_loop()
+                if not shared:
+                    task = segment.pending[all_args] = ensure_future(
+                        _fill(segment, all_args, call, True, timed, metrics)
+                    )
+        if found:
+            _report(metrics, "hit", elapsed)
+            return res
+        if __cache_policy__ is Policy.only_cache:
+            tier = segment.tier
+            res = _MISSING if tier is None else await _in_executor(tier.get, all_args)
+            if res is _MISSING:
+                with segment.lock:
+                    segment.only_cache_misses += 1
+                raise _only_cache_miss(metrics)
+            _report(metrics, "hit", _from_tier(segment, all_args, res, start, timed))
+            return res
+        # shielded, so that one cancelled awaiter doesn't cancel the others
+        res = await shield(task)
+        if shared:
+            with segment.lock:
+                elapsed = _count_hit(segment, start, timed)
+            _report(metrics, "hit", elapsed)
+        return res
+
+    return wrapper
+
+
+def _add_cache_api(
+    wrapper: Callable, segments: list, maxsize: Optional[int], make_key: Callable
+):
+    """!
+    Adds `cache_info`, `cache_clear` and `cache_invalidate` to a cached function.
+    """
+
+    def cache_info() -> CacheInfo:
+        """!
+        @return the statistics of the cache, as a ::CacheInfo
+        """
+        hits = misses = only_cache_misses = evictions = currsize = 0
+        hit_time = miss_time = 0.0
+        for segment in segments:
+            with segment.lock:
+                hits += segment.hits
+                misses += segment.misses
+                only_cache_misses += segment.only_cache_misses
+                evictions += segment.store.evictions
+                currsize += len(segment.store)
+                hit_time += segment.hit_time
+                miss_time += segment.miss_time
+        return CacheInfo(
+            hits, misses, only_cache_misses, evictions, currsize, maxsize, hit_time, miss_time
+        )
+
+    def cache_clear():
+        """!
+        Removes every cached result (including those in a second tier) and resets the statistics.
+        """
+        for segment in segments:
+            with segment.lock:
+                segment.store.clear()
+                segment.reset()
+        if segments[0].tier is not None:
+            segments[0].tier.clear()
+
+    def cache_invalidate(*args, **kwargs):
+        """!
+        Removes the cached result for one argument list, if there is one.
+        """
+        all_args = make_key(args, kwargs)
+        segment = segments[hash(all_args) % len(segments)]
+        with segment.lock:
+            segment.store.discard(all_args)
+        if segment.tier is not None:
+            segment.tier.delete(all_args)
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_invalidate = cache_invalidate
+    return wrapper
+
+
+## @endcond
+
+
+def cached(
+    f: Optional[Callable] = None,
+    /,
+    *,
+    maxsize: Optional[int] = None,
+    policy: str = "lru",
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    sizeof: Callable[[Any], int] = getsizeof,
+    thread_safe: bool = False,
+    stripes: int = 16,
+    tier: Optional[CacheTier] = None,
+    metrics: Optional[Callable[[str, float], Any]] = None,
+    timing: bool = False,
+    hash_buffers: bool = False,
+):
     """!
     A decorator that adds a cache to a function
 
     The returned function can be configured at the callsite
-    by passing a `__cache_control__` keyword parameter that will not be passed to the decorated function.
+    by passing a `__cache_policy__` keyword parameter that will not be passed to the decorated function.
+
+    Without any arguments, the cache is unbounded. Passing any of `maxsize`, `ttl` or `max_bytes`
+    bounds it; entries are then evicted according to `policy` in constant time.
+
+    With `thread_safe`, the cache is split into `stripes` independently locked segments
+    (keys are assigned to segments by hash), and concurrent misses on the same key are deduplicated:
+    the first caller computes the value while the others wait for it, and if the computation raises,
+    every waiter gets the exception. `maxsize` is then shared out evenly between the segments
+    (so that the shares add up to it), and eviction happens per segment; `max_bytes` stays one budget
+    for all segments, so a segment that runs out evicts from the others too.
+
+    Coroutine functions are supported as well: the awaited result is cached,
+    and concurrent awaiters of the same arguments share a single task.
+
+    A `tier` (like ::SQLiteTier) adds a second, usually persistent and process-shared, cache level
+    behind the in-memory one: misses are looked up there before calling the function,
+    new results are written to both levels, and `Policy.only_cache` consults both.
+    The tier is never accessed while holding a segment's lock, and for coroutine functions
+    it's accessed in the event loop's default executor, so its I/O blocks neither other keys nor the loop.
+
+    The returned function also has these attributes:
+    - `cache_info()` returns a ::CacheInfo with the statistics of the cache
+    - `cache_clear()` removes every result and resets the statistics
+    - `cache_invalidate(*args, **kwargs)` removes the result for one argument list
+
+    Arguments are matched by value after binding them to the signature of the decorated function,
+    so `f(1, b=2)`, `f(a=1, b=2)` and `f(b=2, a=1)` share one result, as does `f(1)` if 2 is the default of `b`.
+    Unhashable lists, tuples, dicts and sets are compared by content; objects supporting the buffer protocol
+    (`bytearray`, `array.array`, NumPy arrays, ...) are too if `hash_buffers` is set,
+    by hashing their memory without copying it.
+
+    With `timing`, the seconds spent on hits and misses are added up in `cache_info()`;
+    they aren't measured otherwise, since that would slow every hit down noticeably.
+    If `metrics` is given, it is called as `metrics(event, seconds)` for every `"hit"`, `"miss"`
+    (a call of the decorated function) and `"only_cache_miss"`, e.g. to export them elsewhere.
+
+    ## Example:
+    ```py
+    @cached
+    def f(x):
+        ...
+
+    @cached(maxsize=1024, policy="lfu", ttl=60)
+    def g(x):
+        ...
+
+    g(1, __cache_policy__=Policy.only_cache)  # raises CacheMissException
+    g(1)
+    print(g.cache_info())  # CacheInfo(hits=0, misses=1, only_cache_misses=1, ...)
+    ```
 
     @param f the decorated function
+    @param maxsize the maximum number of cached results
+    @param policy the eviction policy: "lru" (least recently used), "lfu" (least frequently used) or "fifo"
+    @param ttl the number of seconds a result stays valid
+    @param max_bytes the maximum total size of the cached results, as measured by `sizeof`
+    @param sizeof a function measuring the size of a result in bytes (`sys.getsizeof` by default, which is shallow)
+    @param thread_safe whether the cache may be used from several threads at once
+    @param stripes the number of lock stripes of a thread-safe cache
+    @param tier a second cache level, see ::CacheTier
+    @param metrics a callback receiving every cache event and its duration (which implies `timing`)
+    @param timing whether to measure the time spent on hits and misses
+    @param hash_buffers whether to key buffer arguments by a hash of their content
     """
-    cache = {}
+    if f is None:
+        return partial(
+            cached,
+            maxsize=maxsize,
+            policy=policy,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=sizeof,
+            thread_safe=thread_safe,
+            stripes=stripes,
+            tier=tier,
+            metrics=metrics,
+            timing=timing,
+            hash_buffers=hash_buffers,
+        )
+
+    timed = timing or metrics is not None
+    make_key = _key_maker(f, hash_buffers)
+
+    def make_store(maxsize, max_bytes, budget=None):
+        return _make_store(maxsize, policy, ttl, max_bytes, sizeof, budget)
+
+    bound_tier = None if tier is None else _Tier(tier, f"{f.__module__}.{f.__qualname__}")
+    if iscoroutinefunction(f):
+        segments = _make_segments(
+            make_store, maxsize, max_bytes, stripes if thread_safe else 1, bound_tier
+        )
+        return _add_cache_api(
+            _cached_coroutine(f, segments, timed, metrics, make_key), segments, maxsize, make_key
+        )
+    if thread_safe:
+        segments = _make_segments(make_store, maxsize, max_bytes, stripes, bound_tier)
+
+        @wraps(f)
+        def wrapper(*args, __cache_policy__=Policy.try_cache, **kwargs):
+            """!
+            @param __cache_policy__ a Policy enum member
+            """
+            all_args = make_key(args, kwargs)
+            segment = segments[hash(all_args) % len(segments)]
+            if __cache_policy__ is Policy.no_cache:
+                start = perf_counter() if timed else 0.0
+                res = f(*args, **kwargs)
+                with segment.lock:
+                    segment.store.store(all_args, res)
+                    elapsed = _count_miss(segment, start, timed)
+                if bound_tier is not None:
+                    bound_tier.set(all_args, res)
+                _report(metrics, "miss", elapsed)
+                return res
+            return _single_flight(
+                segment, all_args, __cache_policy__, partial(f, *args, **kwargs), timed, metrics
+            )
+
+        return _add_cache_api(wrapper, segments, maxsize, make_key)
+
+    segment = _Segment(make_store(maxsize, max_bytes), bound_tier)
+    store = segment.store
 
     @wraps(f)
     def wrapper(*args, __cache_policy__=Policy.try_cache, **kwargs):
         """!
-        @param __cache_control__ a Policy enum member
+        @param __cache_policy__ a Policy enum member
         """
         policy = __cache_policy__
-        all_args = (args, tuple(kwargs.items()))
-        if all_args in cache and policy is not Policy.no_cache:
-            return cache[all_args]
-        elif policy is Policy.only_cache:
-            raise CacheMissException("argument list was not cached")
+        all_args = make_key(args, kwargs)
+        start = perf_counter() if timed else 0.0
+        if policy is not Policy.no_cache:
+            res = store.lookup(all_args)
+            if res is _MISSING and bound_tier is not None:
+                res = bound_tier.get(all_args)
+                if res is not _MISSING:
+                    store.store(all_args, res)
+            if res is not _MISSING:
+                _report(metrics, "hit", _count_hit(segment, start, timed))
+                return res
+        if policy is Policy.only_cache:
+            segment.only_cache_misses += 1
+            raise _only_cache_miss(metrics)
         res = f(*args, **kwargs)
-        cache[all_args] = res
+        store.store(all_args, res)
+        if bound_tier is not None:
+            bound_tier.set(all_args, res)
+        _report(metrics, "miss", _count_miss(segment, start, timed))
         return res
 
-    return wrapper
+    return _add_cache_api(wrapper, [segment], maxsize, make_key)
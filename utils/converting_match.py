@@ -16,13 +16,25 @@ match Converting(some_string):
     case JSON(value):
         assert isinstance(value, (dict, list))
 ```
+
+To classify many values at once, use ::classify (or ::classify_array for NumPy arrays):
+```py
+for case, value in classify(tokens):
+    if case is pre_made_converters.Digits:
+        ...
+```
 """
-from contextlib import suppress
-from functools import partial
-from typing import Any, Final
+import re
+from functools import lru_cache, partial
+from typing import Any, Callable, Final, Iterable, Iterator, Optional, Pattern, Sequence, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
-__all__ = ('Converting', 'check_for', 'pre_made_converters')
+__all__ = ('Converting', 'check_for', 'pre_made_converters', 'classify', 'classify_array')
 
 
 class _ConverterMeta(type):
@@ -33,61 +45,295 @@ class _ConverterMeta(type):
     __original__ = None
 
 
+## @cond
+## marks a converter that raised a ValueError for the wrapped object
+_FAILED = object()
+
+
+class _Proxy(metaclass=_ConverterMeta):
+    """!
+    Wraps objects whose type can't be subclassed (like `bool` or `NoneType`), passing everything on to them;
+    class patterns still see the type of the object, through `__class__`.
+    """
+
+    def __init__(self, obj):
+        self.__converted__ = None
+        self.__original__: Final = obj
+        self.__results__ = {}
+
+    @property
+    def __class__(self):
+        return type(self.__original__)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__original__, name)
+
+    def __eq__(self, other) -> bool:
+        return self.__original__ == other
+
+    def __hash__(self) -> int:
+        return hash(self.__original__)
+
+    def __bool__(self) -> bool:
+        return bool(self.__original__)
+
+    def __repr__(self) -> str:
+        return repr(self.__original__)
+
+    def __str__(self) -> str:
+        return str(self.__original__)
+
+
+@lru_cache(None)
+def _wrapper_class(cls: type) -> type:
+    """!
+    @return the class ::Converting wraps instances of `cls` in, made once per type
+    """
+    try:
+        class Conv(cls, metaclass=_ConverterMeta):
+            def __init__(self, obj):
+                self.__converted__ = None
+                self.__original__: Final = obj
+                self.__results__ = {}
+    except TypeError:  # not an acceptable base type, or a conflicting metaclass
+        return _Proxy
+    return Conv
+
+
+## @endcond
+
+
 def Converting(obj):
     """!
     A wrapper for an object to be used with match cases involving ::check_for.
 
     For ideal results, type(obj) should implement something akin to a "copy constructor",
     that is, `type(obj)(obj) is obj` should be True (many built-in types do this, so it already works with them).
+    Objects of types that can't be subclassed are wrapped in a proxy instead, which compares equal to them
+    and passes attribute access on (but isn't them, so patterns like `case None:` that compare by identity don't match).
+
+    The wrapper remembers the result of every converter it was checked with (including failures),
+    so cases and guards using the same converter only convert once.
+    The wrapper class is made once per type of the wrapped objects.
 
     @param obj the object to be wrapped
     @return a wrapper object
     """
-    class Conv(type(obj), metaclass=_ConverterMeta):
-        def __init__(self, obj):
-            self.__converted__ = None
-            self.__original__: Final = obj
-    return Conv(obj)
+    cls = _wrapper_class(type(obj))
+    if cls is _Proxy:
+        return _Proxy(obj)
+    try:
+        return cls(obj)
+    except TypeError:  # no copy constructor
+        return _Proxy(obj)
 
 
-def check_for(converter):
+def check_for(converter, screen: Optional[Union[str, Pattern]] = None):
     """!
     A match case for ::Converting.
 
+    The results are remembered by the ::Converting wrapper, keyed by `converter`,
+    so all cases using the same converter share them.
+
+    `screen` is a regular expression that every string the converter accepts matches completely;
+    strings it doesn't match are rejected without calling the converter (and raising and catching its ValueError),
+    which makes rejecting cheap. It may match strings the converter rejects, those are still converted.
+
     @param converter a callable object that converts the wrapped object to another object
+    @param screen a regular expression matching (at least) all strings the converter accepts
     @return a match case
     """
+    try:
+        hash(converter)
+        key = converter
+    except TypeError:
+        key = id(converter)
+    screen = None if screen is None else re.compile(screen)
+    accepts = None if screen is None else screen.fullmatch
+
+    def convert(obj: Any) -> Any:
+        if accepts is not None and isinstance(obj, str) and accepts(obj) is None:
+            return _FAILED
+        try:
+            return converter(obj)
+        except ValueError:
+            return _FAILED
+
     class Meta(type):
         __conv__ = staticmethod(converter)
+        __screen__ = screen
+        __convert__ = staticmethod(convert)
         __match_args__ = ('__converted__',)
 
         def __instancecheck__(self, instance: Any) -> bool:
-            with suppress(ValueError):
-                is_converting = isinstance(type(instance), _ConverterMeta)
-                if is_converting:
-                    assert hasattr(instance, '__converted__')
-                    assert hasattr(instance, '__original__')
-                value = self.__conv__(instance.__original__ if is_converting else instance)
-                if is_converting:
-                    instance.__converted__ = value
-                return True
-            return False
+            if not isinstance(type(instance), _ConverterMeta):
+                return convert(instance) is not _FAILED
+            results = instance.__results__
+            value = results.get(key, _FAILED)
+            if value is _FAILED and key not in results:
+                value = results[key] = convert(instance.__original__)
+            if value is _FAILED:
+                return False
+            instance.__converted__ = value
+            return True
     return Meta(f'check_for({converter!r})', (), {})
 
 
+## @cond
+# screens for the pre-made converters; they only need to let through everything the converters accept
+# (\d and \s match all the Unicode digits and spaces that int and float accept)
+_DIGITS = r'\d+(?:_\d+)*'
+_HEX_DIGITS = r'[\da-fA-F]+(?:_[\da-fA-F]+)*'
+_FLOAT = r'(?:[\d_]*\.?[\d_]*(?:[eE][+-]?[\d_]+)?|(?i:inf|infinity|nan))'
+## @endcond
+
+
 class pre_made_converters:
     """!
     Contains some converters
     """
     ## A converter from digits
-    Digits = check_for(int)
+    Digits = check_for(int, rf'\s*[+-]?{_DIGITS}\s*')
     ## A converter from hexadecimal
-    Hexadecimal = check_for(partial(int, base=16))
+    Hexadecimal = check_for(partial(int, base=16), rf'\s*[+-]?(?:0[xX]_?)?{_HEX_DIGITS}\s*')
     ## A converter from binary
-    Binary = check_for(partial(int, base=2))
+    Binary = check_for(partial(int, base=2), rf'\s*[+-]?(?:0[bB]_?)?{_DIGITS}\s*')
     ## A converter from octal
-    Octal = check_for(partial(int, base=8))
+    Octal = check_for(partial(int, base=8), rf'\s*[+-]?(?:0[oO]_?)?{_DIGITS}\s*')
     ## A converter from float
-    Float = check_for(float)
+    Float = check_for(float, rf'\s*[+-]?{_FLOAT}\s*')
     ## A converter from complex
-    Complex = check_for(complex)
+    Complex = check_for(complex, r'(?i:[\s()\d_.e+\-j]|inf(?:inity)?|nan)+')
+
+
+## @cond
+_DEFAULT_CASES = (
+    pre_made_converters.Digits,
+    pre_made_converters.Hexadecimal,
+    pre_made_converters.Binary,
+    pre_made_converters.Octal,
+    pre_made_converters.Float,
+    pre_made_converters.Complex,
+)
+
+
+## the flags a group can set for itself, by their letters in `(?flags:...)`
+_SCOPED_FLAGS = {'i': re.IGNORECASE, 'm': re.MULTILINE, 's': re.DOTALL, 'x': re.VERBOSE}
+
+
+@lru_cache(None)
+def _combined_screen(cases: tuple) -> Optional[Callable[[str], Any]]:
+    """!
+    Combines the screens of `cases` into one regular expression with a named group per case,
+    so that a single match finds the first case whose screen accepts a string.
+
+    @return its `fullmatch`, or None if a case has no screen or the screens can't be combined
+    (like those with flags other than those of ::_SCOPED_FLAGS)
+    """
+    if any(case.__screen__ is None for case in cases):
+        return None
+    groups = []
+    for i, case in enumerate(cases):
+        screen = case.__screen__
+        # flags compiled into a screen have to be scoped to its group
+        flags = ''.join(letter for letter, flag in _SCOPED_FLAGS.items() if screen.flags & flag)
+        if screen.flags & ~(re.UNICODE | sum(_SCOPED_FLAGS.values())) or not isinstance(screen.pattern, str):
+            return None
+        pattern = f'(?{flags}:{screen.pattern})' if flags else screen.pattern
+        groups.append(f'(?P<_case{i}>{pattern})')
+    try:
+        return re.compile('|'.join(groups)).fullmatch
+    except re.error:  # e.g. global flags or numbered backreferences in a screen
+        return None
+
+
+## @endcond
+
+
+def classify(
+    iterable: Iterable, cases: Optional[Sequence[type]] = None, memo: int = 4096
+) -> Iterator[Tuple[Optional[type], Any]]:
+    """!
+    Classifies values by the first of `cases` (made with ::check_for) whose converter accepts them,
+    like a `match` statement over `Converting(value)` with one case per converter would,
+    but without wrapping the values and checking the cases' screens first, so that usually
+    only the converter of the matching case is called.
+    If all cases have screens, they are checked for strings with one combined regular expression.
+
+    The results for the last `memo` distinct strings are remembered, since tokens tend to repeat;
+    equal strings then share their converted value, so pass 0 for converters returning mutable objects.
+
+    The results are produced lazily, so `iterable` can be a stream.
+
+    ## Example:
+    ```py
+    list(classify(['12', 'ff', '1.5', 'x']))
+    # [(Digits, 12), (Hexadecimal, 255), (Float, 1.5), (None, 'x')]
+    ```
+
+    @param iterable the values to classify
+    @param cases the cases to try in order, by default the ::pre_made_converters from Digits to Complex
+    @param memo how many distinct strings to remember the results of
+    @return an iterator of (case, converted value) pairs, or (None, value) if no case matches
+    """
+    cases = _DEFAULT_CASES if cases is None else tuple(cases)
+    converters = [(case, case.__convert__) for case in cases]
+    screen = _combined_screen(cases)
+
+    def classify_one(value: Any) -> Tuple[Optional[type], Any]:
+        start = 0
+        if screen is not None and type(value) is str:
+            match = screen(value)
+            if match is None:
+                return None, value
+            start = int(match.lastgroup[5:])
+            # its screen already accepted the value
+            case = cases[start]
+            try:
+                return case, case.__conv__(value)
+            except ValueError:
+                start += 1
+        for case, convert in converters[start:]:
+            converted = convert(value)
+            if converted is not _FAILED:
+                return case, converted
+        return None, value
+
+    results = {}
+    for value in iterable:
+        if type(value) is not str or not memo:
+            yield classify_one(value)
+            continue
+        res = results.get(value)
+        if res is None:
+            if len(results) >= memo:
+                results.clear()
+            res = results[value] = classify_one(value)
+        yield res
+
+
+def classify_array(array, cases: Optional[Sequence[type]] = None):
+    """!
+    Classifies the values of a NumPy array (usually of strings) like ::classify,
+    converting every distinct value only once.
+
+    @param array the values to classify, anything `numpy.asarray` accepts
+    @param cases the cases to try in order, see ::classify
+    @return a pair of arrays of the shape of `array`: the index of each value's case in `cases`
+    (-1 if none matched), and the converted values (the original value if none matched), as objects
+    """
+    if numpy is None:
+        raise ImportError("classify_array needs numpy")
+    cases = _DEFAULT_CASES if cases is None else tuple(cases)
+    index = {case: i for i, case in enumerate(cases)}
+    array = numpy.asarray(array)
+    distinct, inverse = numpy.unique(array, return_inverse=True)
+    labels = numpy.empty(len(distinct), dtype=numpy.intp)
+    values = numpy.empty(len(distinct), dtype=object)
+    # item() turns numpy's scalars into the Python objects the screens and converters expect
+    items = (v.item() if isinstance(v, numpy.generic) else v for v in distinct)
+    for i, (case, value) in enumerate(classify(items, cases, memo=0)):
+        labels[i] = -1 if case is None else index[case]
+        values[i] = value
+    inverse = inverse.reshape(array.shape)
+    return labels[inverse], values[inverse]
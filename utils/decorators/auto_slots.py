@@ -1,24 +1,243 @@
 """!
 This module contains a class decorator that adds `__slots__` to the decorated class.
 """
-from dis import Bytecode
-from inspect import signature
+import tracemalloc
+from dis import get_instructions
+from functools import partial
+from types import CellType, CodeType, FunctionType
+from typing import Iterator, NamedTuple, Optional, Set, Tuple
 
 
-__all__ = ['auto_slots']
+__all__ = ['auto_slots', 'SlotsReport']
 
 
-def auto_slots(cls: type) -> type:
+class SlotsReport(NamedTuple):
+    """!
+    The memory an `auto_slots` class saves, as returned by `auto_slots.report`
+    """
+
+    ## the slots the class got, including those of its base classes
+    slots: Tuple[str, ...]
+    ## whether the instances still have a `__dict__` (see ::auto_slots)
+    has_dict: bool
+    ## the memory an instance of the class without `__slots__` takes, with all its attributes set
+    dict_bytes: int
+    ## the memory an instance of the slotted class takes, with all its attributes set
+    slots_bytes: int
+    ## the bytes saved per instance
+    saved: int
+
+
+## @cond
+def _is_self(instruction, self_name: str) -> bool:
+    if instruction.opname.startswith('LOAD_FAST'):
+        # LOAD_FAST_LOAD_FAST (3.13+) loads two names, the last one is on top of the stack
+        argval = instruction.argval
+        return (argval[-1] if isinstance(argval, tuple) else argval) == self_name
+    return instruction.opname == 'LOAD_DEREF' and instruction.argval == self_name
+
+
+def _assigned(code: CodeType, self_name: str) -> Iterator[str]:
+    """!
+    @return the names of the attributes of `self_name` that `code` (or a function nested in it) assigns,
+    found by the names of the opcodes, which (unlike their numbers) are the same across Python versions
+    """
+    instructions = [i for i in get_instructions(code) if i.opname not in {'CACHE', 'EXTENDED_ARG'}]
+    for idx, instruction in enumerate(instructions):
+        if instruction.opname != 'STORE_ATTR' or idx == 0:
+            continue
+        previous = instructions[idx - 1]
+        if _is_self(previous, self_name):
+            # self.x = ...
+            yield instruction.argval
+        elif previous.opname == 'SWAP':
+            # self.x += ..., which loads self.x after copying self
+            for back in range(idx - 1, 1, -1):
+                load = instructions[back]
+                if load.opname == 'LOAD_ATTR' and load.argval == instruction.argval:
+                    if instructions[back - 1].opname == 'COPY' and _is_self(instructions[back - 2], self_name):
+                        yield instruction.argval
+                    break
+    for const in code.co_consts:
+        # functions (and comprehensions) nested in a method see self as a free variable
+        if isinstance(const, CodeType) and self_name in const.co_freevars:
+            yield from _assigned(const, self_name)
+
+
+def _functions(value) -> Iterator[FunctionType]:
+    """!
+    @return the functions that make up a class attribute and are called with an instance as first argument
+    """
+    if isinstance(value, (staticmethod, classmethod)):
+        return
+    if isinstance(value, property):
+        yield from (f for f in (value.fget, value.fset, value.fdel) if isinstance(f, FunctionType))
+    elif isinstance(value, FunctionType):
+        yield value
+
+
+def _attributes(cls: type) -> Set[str]:
+    """!
+    @return the attributes of `self` that the methods (and properties) of `cls` assign
+    """
+    names = set()
+    for value in cls.__dict__.values():
+        for function in _functions(value):
+            code = function.__code__
+            # co_argcount counts the positional-only parameters too; methods taking only *args have no named self
+            if code.co_argcount == 0:
+                continue
+            names.update(_assigned(code, code.co_varnames[0]))
+    return names
+
+
+def _base_slots(bases: tuple) -> Set[str]:
+    slots = set()
+    for base in bases:
+        for klass in base.__mro__:
+            own = klass.__dict__.get('__slots__', ())
+            slots.update((own,) if isinstance(own, str) else own)
+    return slots
+
+
+def _is_data_descriptor(cls: type, name: str) -> bool:
+    # assignments to these (like property setters) go through the descriptor and need no storage
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            attr = type(klass.__dict__[name])
+            return hasattr(attr, '__set__') or hasattr(attr, '__delete__')
+    return False
+
+
+def _rebind(function, old: type, cell: CellType):
+    """!
+    @return a copy of `function` whose `__class__` cell (for `super()`) is `cell`, if it referred to `old`;
+    the original keeps its cell, so that the undecorated class keeps working
+    """
+    if not isinstance(function, FunctionType) or '__class__' not in function.__code__.co_freevars:
+        return function
+    code = function.__code__
+    index = code.co_freevars.index('__class__')
+    if function.__closure__[index].cell_contents is not old:
+        return function
+    closure = function.__closure__[:index] + (cell,) + function.__closure__[index + 1:]
+    copy = FunctionType(code, function.__globals__, function.__name__, function.__defaults__, closure)
+    copy.__kwdefaults__ = function.__kwdefaults__
+    copy.__qualname__ = function.__qualname__
+    copy.__module__ = function.__module__
+    copy.__doc__ = function.__doc__
+    copy.__annotations__ = function.__annotations__
+    copy.__dict__.update(function.__dict__)
+    return copy
+
+
+def _rebind_class_cells(namespace: dict, old: type) -> CellType:
+    """!
+    Replaces the methods of `namespace` that refer to `old` through their `__class__` cell by copies
+    sharing a new cell, in place.
+
+    @return the new cell, to be filled with the new class once it exists
+    """
+    cell = CellType()
+    rebind = partial(_rebind, old=old, cell=cell)
+    for key, value in namespace.items():
+        if isinstance(value, (staticmethod, classmethod)):
+            function = rebind(value.__func__)
+            if function is not value.__func__:
+                namespace[key] = type(value)(function)
+        elif isinstance(value, property):
+            functions = (value.fget, value.fset, value.fdel)
+            rebound = tuple(map(rebind, functions))
+            if rebound != functions:
+                namespace[key] = type(value)(*rebound, value.__doc__)
+        else:
+            namespace[key] = rebind(value)
+    return cell
+
+
+def _instance_size(cls: type, names, count: int = 1000) -> Optional[float]:
+    """!
+    Measures the memory taken by bare instances of `cls` with the given attributes set to None,
+    with tracemalloc over `count` of them.
+
+    The instances are never asked for their `__dict__`: since Python 3.11, instances store their attributes
+    inline until it is read, so measuring it with `sys.getsizeof` would overstate what they take.
+
+    @return the bytes per instance, or None if they can't be created without calling `__init__`
+    """
+
+    def make():
+        obj = object.__new__(cls)
+        for name in names:
+            object.__setattr__(obj, name, None)
+        return obj
+
+    try:
+        # also allocates what all instances share, like the keys of their dicts
+        make()
+    except (TypeError, AttributeError):
+        return None
+    instances = [None] * count
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            instances[i] = make()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return (after - before) / count
+
+
+def _report(cls: type) -> SlotsReport:
+    """!
+    Measures how much memory the slots of an `auto_slots` class save per instance,
+    compared to the class without `__slots__`.
+
+    The sizes are those of the instance objects themselves (and their `__dict__`), not of the attribute values,
+    measured with tracemalloc over a batch of instances (which is slow: don't call it on a hot path).
+
+    @param cls a class decorated with `auto_slots`
+    @return a ::SlotsReport
+    """
+    original = cls.__dict__.get('__auto_slots_original__')
+    if original is None:
+        raise TypeError(f"{cls.__qualname__} wasn't made by auto_slots")
+    slots = tuple(sorted(_base_slots((cls,)) - {'__dict__', '__weakref__'}))
+    has_dict = cls.__dictoffset__ != 0
+    attributes = slots + tuple(cls.__dict__.get('__auto_slots_unslotted__', ()))
+    dict_bytes = _instance_size(original, attributes)
+    slots_bytes = _instance_size(cls, attributes)
+    if dict_bytes is None or slots_bytes is None:
+        raise TypeError(f"can't create bare instances of {cls.__qualname__} to measure")
+    dict_bytes, slots_bytes = round(dict_bytes), round(slots_bytes)
+    return SlotsReport(slots, has_dict, dict_bytes, slots_bytes, dict_bytes - slots_bytes)
+
+
+## @endcond
+
+
+def auto_slots(cls: Optional[type] = None, /, *, weakref: bool = False) -> type:
     """!
     The auto_slots decorator.
-    
+
     This class decorator will automatically generate a `__slots__` attribute ("make your class slotted")
-    based on the attribute assignments to `self` in the decorated class' `__init__` method.
-    
+    based on the attribute assignments to `self` in the decorated class' methods (and property setters).
+
     If your class already uses slots, this decorator has no effect. It is intended if you want to benefit
     from making your classes slotted, but don't want to go through and figure out which slots you need;
     You can just put `@auto_slots` in front of your class, and now your class is slotted.
-    
+
+    Attributes that a base class already has slots for aren't slotted again. Instances only lose their
+    `__dict__` if all base classes are slotted as well (like other `auto_slots` classes); and if an assigned
+    attribute is also a class attribute (like a default value), it can't be a slot, so instances keep a `__dict__`
+    for it. With `weakref`, instances can be weakly referenced.
+
+    `auto_slots.report(cls)` measures the bytes saved per instance, see ::SlotsReport.
+
     ## Example:
 
     ### This is the intended use
@@ -30,6 +249,7 @@ def auto_slots(cls: type) -> type:
             self.y = y + 1
             self.z = []
     print(C.__slots__)  # prints ('x', 'y', 'z')
+    print(auto_slots.report(C).saved)  # the bytes saved per instance
     ```
 
     ### While not incorrect, this may be unexpected
@@ -37,21 +257,39 @@ def auto_slots(cls: type) -> type:
     @auto_slots
     class C:
         __slots__ = ['x']
-        # no explicit __init__ => would take object.__init__ (which doesn't define any attributes)
-        def set_x(self, val):
-            self.x = val  # no error: C already has a __slots__ attribute
+        def set_y(self, val):
+            self.y = val  # AttributeError: C already has a __slots__ attribute, so y isn't added
     ```
     @param cls The decorated class
+    @param weakref whether to add a `__weakref__` slot
     """
-    if hasattr(cls, '__slots__'):
+    if cls is None:
+        return partial(auto_slots, weakref=weakref)
+    if '__slots__' in cls.__dict__:
         return cls
-    slots = set()
-    bytecode = Bytecode(cls.__init__)
-    self_name = next(signature(cls.__init__).parameters.keys())
-    instructions = tuple(bytecode)
-    for idx, instruction in enumerate(instructions[2:], 2):
-        if instruction.opcode == 95 and (instr1 := instructions[idx-1]).opcode == 124 and instr1.argval == self_name:
-            slots.add(instruction.argval)
+    inherited = _base_slots(cls.__bases__)
+    names = {name for name in _attributes(cls) - inherited if not _is_data_descriptor(cls, name)}
+    # a slot would replace the class attribute of the same name
+    unslotted = {name for name in names if name in cls.__dict__}
+    slots = sorted(names - unslotted)
+    if unslotted and not any(base.__dictoffset__ for base in cls.__bases__):
+        slots.append('__dict__')
+    if weakref and not any(base.__weakrefoffset__ for base in cls.__bases__):
+        slots.append('__weakref__')
 
+    namespace = dict(cls.__dict__)
+    namespace.pop('__dict__', None)
+    namespace.pop('__weakref__', None)
+    namespace['__slots__'] = tuple(slots)
+    namespace['__auto_slots_original__'] = cls
+    if unslotted:
+        namespace['__auto_slots_unslotted__'] = tuple(sorted(unslotted))
+    # methods using super() or __class__ refer to the class through a cell, which holds the old class
+    cell = _rebind_class_cells(namespace, cls)
     meta = type(cls)
-    return meta(cls.__name__, tuple(cls.mro()), dict(cls.__dict__) | {'__slots__': tuple(slots)})
+    new_cls = meta(cls.__name__, cls.__bases__, namespace)
+    cell.cell_contents = new_cls
+    return new_cls
+
+
+auto_slots.report = _report
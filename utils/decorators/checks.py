@@ -0,0 +1,354 @@
+"""!
+Central configuration of the runtime checks done by `strict`, `precondition` and `postcondition`.
+
+The checks run in one of three modes:
+- `"on"`: every call is checked (the default)
+- `"off"`: nothing is checked; functions decorated while checks are off are returned unwrapped,
+  and functions decorated earlier pass their calls straight through
+- `"sample"`: one call in `sample_rate` is checked; violations are passed to the `reporter`
+  if there is one, and raised otherwise
+
+The initial mode is read from the `UTILS_CHECKS` environment variable, the initial sample rate
+from `UTILS_CHECKS_SAMPLE_RATE`. Both can be changed at any time with ::configure,
+which affects already decorated functions as well.
+
+Contracts can also be checked off the critical path (`offload=True`): the check runs in a pool of
+background threads (or, with `offload="asyncio"`, as a callback of the running event loop), and violations
+are passed to the `reporter` (or issued as a `RuntimeWarning` without one) instead of being raised.
+At most `queue_size` checks wait at a time; when the queue is full, `backpressure` decides whether
+new checks are dropped (`"drop"`), wait for room (`"block"`) or run in the calling thread (`"inline"`).
+
+## Example:
+```py
+from utils.decorators import checks
+
+checks.configure(mode="sample", sample_rate=1000, reporter=logger.warning)
+```
+"""
+import asyncio
+import os
+import sys
+import traceback
+import warnings
+from queue import Full, Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+__all__ = ["configure", "get_config", "ChecksConfig", "flush", "offload_info", "OffloadInfo"]
+
+## @cond
+MODES = ("on", "off", "sample")
+OFFLOAD_MODES = ("thread", "asyncio")
+BACKPRESSURE = ("drop", "block", "inline")
+_UNSET = object()
+## @endcond
+
+
+class ChecksConfig(NamedTuple):
+    """!
+    The current check configuration, as returned by ::get_config
+    """
+
+    ## "on", "off" or "sample"
+    mode: str
+    ## in sample mode, one in this many calls is checked
+    sample_rate: int
+    ## in sample mode, called with every violation instead of raising it; also gets offloaded violations
+    reporter: Optional[Callable[[Exception], Any]]
+    ## the number of threads checking offloaded conditions
+    workers: int
+    ## the most offloaded checks waiting at a time
+    queue_size: int
+    ## what happens to offloaded checks when the queue is full: "drop", "block" or "inline"
+    backpressure: str
+
+
+class OffloadInfo(NamedTuple):
+    """!
+    Statistics of the offloaded checks, as returned by ::offload_info
+    """
+
+    ## checks waiting or running
+    pending: int
+    ## checks that ran to completion
+    completed: int
+    ## checks dropped because the queue was full
+    dropped: int
+    ## checks that ran in the calling thread because the queue was full
+    inline: int
+    ## violations found by offloaded checks
+    violations: int
+
+
+## @cond
+class _Config:
+    __slots__ = ("mode", "sample_rate", "reporter", "workers", "queue_size", "backpressure")
+
+    def __init__(self, mode: str, sample_rate: int):
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.reporter = None
+        self.workers = 2
+        self.queue_size = 1024
+        self.backpressure = "drop"
+
+
+def _validate(mode: str, sample_rate: int):
+    if mode not in MODES:
+        raise ValueError(f"invalid check mode {mode!r}, expected one of {', '.join(map(repr, MODES))}")
+    if sample_rate < 1:
+        raise ValueError(f"the sample rate must be at least 1, got {sample_rate}")
+
+
+def _validate_offload(workers: int, queue_size: int, backpressure: str):
+    if workers < 1:
+        raise ValueError(f"at least one worker is needed, got {workers}")
+    if queue_size < 1:
+        raise ValueError(f"the queue size must be at least 1, got {queue_size}")
+    if backpressure not in BACKPRESSURE:
+        raise ValueError(
+            f"invalid backpressure policy {backpressure!r}, expected one of {', '.join(map(repr, BACKPRESSURE))}"
+        )
+
+
+_config = _Config(
+    os.environ.get("UTILS_CHECKS", "on").strip().lower(),
+    int(os.environ.get("UTILS_CHECKS_SAMPLE_RATE", "100")),
+)
+_validate(_config.mode, _config.sample_rate)
+
+
+def stripped() -> bool:
+    """!
+    @return whether decorators should return the decorated function unwrapped
+    """
+    return _config.mode == "off"
+
+
+def should_check(counter: Iterator[int]) -> bool:
+    """!
+    @param counter the call counter of the calling wrapper (an `itertools.count()`)
+    @return whether the current call should be checked
+    """
+    mode = _config.mode
+    if mode == "on":
+        return True
+    if mode == "off":
+        return False
+    return next(counter) % _config.sample_rate == 0
+
+
+def violation(exc: Exception):
+    """!
+    Raises `exc`, or passes it to the reporter in sample mode.
+    """
+    if _config.mode == "sample" and _config.reporter is not None:
+        _config.reporter(exc)
+    else:
+        raise exc
+
+
+def offload_mode(offload) -> Optional[str]:
+    """!
+    Normalizes the `offload` argument of a decorator.
+
+    @return None for no offloading, else "thread" or "asyncio"
+    """
+    if offload is None or offload is False:
+        return None
+    if offload is True:
+        return "thread"
+    if offload not in OFFLOAD_MODES:
+        raise ValueError(
+            f"invalid offload mode {offload!r}, expected True, False or one of {', '.join(map(repr, OFFLOAD_MODES))}"
+        )
+    return offload
+
+
+class _Offloader:
+    """!
+    Runs checks in background threads or event loop callbacks.
+
+    A check is a callable returning the violation it found, or None.
+    Threads don't survive a fork, so the queue and the workers are per process.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pid = None
+        self.completed = self.dropped = self.inline = self.violations = 0
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.queue = Queue(_config.queue_size)
+        self.threads = []
+        self.scheduled = 0
+
+    def submit(self, mode: str, check: Callable[[], Optional[Exception]]):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.reset()
+        if mode == "asyncio":
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                if self.scheduled < _config.queue_size:
+                    with self.lock:
+                        self.scheduled += 1
+                    loop.call_soon(self.run_scheduled, check)
+                elif _config.backpressure == "drop":
+                    self.count("dropped")
+                else:
+                    # blocking would stall the event loop the check needs to run
+                    self.count("inline")
+                    self.run(check)
+                return
+        if len(self.threads) < _config.workers or not all(t.is_alive() for t in self.threads):
+            with self.lock:
+                # a worker only dies with the interpreter, but if one did, its queue would never be served
+                self.threads = [t for t in self.threads if t.is_alive()]
+                while len(self.threads) < _config.workers:
+                    thread = Thread(target=self.work, daemon=True, name="checks-offload")
+                    self.threads.append(thread)
+                    thread.start()
+        try:
+            self.queue.put(check, block=_config.backpressure == "block")
+        except Full:
+            if _config.backpressure == "drop":
+                self.count("dropped")
+            else:
+                self.count("inline")
+                self.run(check)
+
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def run(self, check: Callable[[], Optional[Exception]]):
+        try:
+            exc = check()
+        except Exception as e:  # a failing check is reported like a violation
+            exc = e
+        self.count("completed")
+        if exc is not None:
+            self.count("violations")
+            report(exc)
+
+    def run_scheduled(self, check: Callable[[], Optional[Exception]]):
+        try:
+            self.run(check)
+        finally:
+            with self.lock:
+                self.scheduled -= 1
+
+    def work(self):
+        queue = self.queue
+        while True:
+            check = queue.get()
+            try:
+                self.run(check)
+            except BaseException:
+                # a raising reporter (or a warning turned into an error) must not end the worker,
+                # or the checks queued after it would never run
+                print("Exception while reporting an offloaded check:", file=sys.stderr)
+                traceback.print_exc()
+            finally:
+                queue.task_done()
+
+
+_offloader = _Offloader()
+
+
+def offload(mode: str, check: Callable[[], Optional[Exception]]):
+    """!
+    Runs `check` in the background (see ::offload_mode), reporting the violation it returns.
+    """
+    _offloader.submit(mode, check)
+
+
+def report(exc: Exception):
+    """!
+    Passes a violation found off the critical path to the reporter, or warns about it.
+    """
+    if _config.reporter is not None:
+        _config.reporter(exc)
+    else:
+        warnings.warn(f"{type(exc).__name__}: {exc}", RuntimeWarning)
+
+
+## @endcond
+
+
+def configure(
+    mode: Optional[str] = None,
+    sample_rate: Optional[int] = None,
+    reporter: Optional[Callable[[Exception], Any]] = _UNSET,
+    workers: Optional[int] = None,
+    queue_size: Optional[int] = None,
+    backpressure: Optional[str] = None,
+):
+    """!
+    Changes the check configuration; arguments that are not given keep their current value.
+
+    A new queue size applies from the first offloaded check of a process on (it can't change once checks
+    are queued), and the number of worker threads never shrinks.
+
+    @param mode "on", "off" or "sample"
+    @param sample_rate in sample mode, one in this many calls is checked
+    @param reporter in sample mode, a callable receiving every violation instead of raising it (None to raise);
+    also receives the violations of offloaded checks (None to warn)
+    @param workers the number of threads checking offloaded conditions
+    @param queue_size the most offloaded checks waiting at a time
+    @param backpressure what happens to offloaded checks when the queue is full: "drop", "block" or "inline"
+    """
+    mode = _config.mode if mode is None else mode
+    sample_rate = _config.sample_rate if sample_rate is None else sample_rate
+    workers = _config.workers if workers is None else workers
+    queue_size = _config.queue_size if queue_size is None else queue_size
+    backpressure = _config.backpressure if backpressure is None else backpressure
+    _validate(mode, sample_rate)
+    _validate_offload(workers, queue_size, backpressure)
+    _config.mode = mode
+    _config.sample_rate = sample_rate
+    _config.workers = workers
+    _config.queue_size = queue_size
+    _config.backpressure = backpressure
+    if reporter is not _UNSET:
+        _config.reporter = reporter
+
+
+def get_config() -> ChecksConfig:
+    """!
+    @return the current check configuration
+    """
+    return ChecksConfig(
+        _config.mode,
+        _config.sample_rate,
+        _config.reporter,
+        _config.workers,
+        _config.queue_size,
+        _config.backpressure,
+    )
+
+
+def flush():
+    """!
+    Waits until every check offloaded to the background threads has run.
+    """
+    if _offloader.pid == os.getpid():
+        _offloader.queue.join()
+
+
+def offload_info() -> OffloadInfo:
+    """!
+    @return statistics of the offloaded checks
+    """
+    pending = 0
+    if _offloader.pid == os.getpid():
+        pending = _offloader.scheduled + _offloader.queue.unfinished_tasks
+    return OffloadInfo(
+        pending, _offloader.completed, _offloader.dropped, _offloader.inline, _offloader.violations
+    )
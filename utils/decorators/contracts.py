@@ -1,21 +1,225 @@
 """!
 This module contains decorators to check pre- and postconditions to a function and throw a ValueError if they're not fulfilled.
+
+Whether and how often the conditions are checked is configured centrally in ::checks.
+
+Stacked contract decorators don't nest: each one merges its condition into the wrapper below it,
+so a function with any number of contracts gets a single wrapper that binds the arguments once per call.
+
+Expensive conditions can be checked off the critical path with `offload`: the call goes on
+while the condition is checked in the background, and violations are reported instead of raised (see ::checks).
 """
-from functools import wraps
-from inspect import signature
-from typing import Callable, Tuple
-from functools import partial
+from functools import partial, wraps
+from inspect import signature, Parameter
+from itertools import count
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+from . import checks
+
+__all__ = ["precondition", "postcondition", "contract"]
+
+
+## @cond
+class _Contract:
+    """!
+    The flat list of conditions of a contract wrapper, stored as its `__contract__`.
+
+    `pre` is in checking order (outermost decorator first), `post` too (innermost decorator first);
+    their entries end with the offload mode of the condition (see ::checks.offload_mode).
+    """
+
+    __slots__ = ("func", "sig", "pre", "post", "invariant", "wrapper")
+
+    def __init__(self, func: Callable, pre: list, post: list, invariant: list):
+        self.func = func
+        self.sig = signature(func)
+        self.pre = pre
+        self.post = post
+        self.invariant = invariant
+        self.wrapper = None
+
+
+def _wants_self(condition: Callable) -> bool:
+    try:
+        return "self" in signature(condition).parameters
+    except (TypeError, ValueError):  # some builtins have no signature
+        return False
+
+
+def _defaults(sig, names: Iterable[str]) -> tuple:
+    """!
+    @return the default of each named parameter, None for parameters without one (or unknown names)
+    """
+    res = []
+    for name in names:
+        par = sig.parameters.get(name)
+        res.append(None if par is None or par.default is Parameter.empty else par.default)
+    return tuple(res)
+
+
+def _check(message: str, condition: Callable[..., bool], args: list, kwargs: dict) -> Optional[ValueError]:
+    """!
+    An offloaded check: @return the violation, if the condition isn't satisfied
+    """
+    if not condition(*args, **kwargs):
+        return ValueError(message)
+    return None
+
+
+def _make_wrapper(contract: _Contract) -> Callable:
+    func, sig = contract.func, contract.sig
+    pre = [
+        (
+            f"{description} condition not satisfied",
+            tuple(zip(c_args, _defaults(sig, c_args))),
+            condition,
+            offload,
+        )
+        for description, c_args, condition, offload in contract.pre
+    ]
+    post = [
+        (f"{description} condition not satisfied", condition, _wants_self(condition), offload)
+        for description, condition, offload in contract.post
+    ]
+    invariant = [
+        (f"{description} invariant not satisfied", condition)
+        for description, condition in contract.invariant
+    ]
+    needs_self = invariant or any(takes_self for _, _, takes_self, _ in post)
+    if needs_self:
+        if not sig.parameters:
+            raise TypeError(f"{func.__qualname__} has no self parameter to check the contract with")
+        self_name = "self" if "self" in sig.parameters else next(iter(sig.parameters))
+    needs_bind = needs_self or any(c_args for _, c_args, _, _ in pre)
+    counter = count()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not checks.should_check(counter):
+            return func(*args, **kwargs)
+        if needs_bind:
+            arguments = sig.bind(*args, **kwargs).arguments
+        for message, c_args, condition, offload in pre:
+            values = [arguments.get(arg, default) for arg, default in c_args]
+            if offload:
+                checks.offload(offload, partial(_check, message, condition, values, {}))
+            elif not condition(*values):
+                checks.violation(ValueError(message))
+        if invariant:
+            self = arguments[self_name]
+            for message, condition in invariant:
+                if not condition(self):
+                    checks.violation(ValueError(message))
+        res = func(*args, **kwargs)
+        for message, condition, takes_self, offload in post:
+            extra = {"self": arguments[self_name]} if takes_self else {}
+            if offload:
+                checks.offload(offload, partial(_check, message, condition, [res], extra))
+            elif not condition(res, **extra):
+                checks.violation(ValueError(message))
+        for message, condition in invariant:
+            if not condition(self):
+                checks.violation(ValueError(message))
+        return res
+
+    wrapper.__contract__ = contract
+    contract.wrapper = wrapper
+    return wrapper
+
+
+def _merge(func: Callable, pre: list, post: list, invariant: list) -> Callable:
+    """!
+    Adds conditions to the contract of `func` if it is a contract wrapper, or wraps it in a new one.
+    The existing wrapper is left as it is, so it can still be used on its own.
+    """
+    inner = getattr(func, "__contract__", None)
+    # other decorators copy the attribute with `wraps`; only merge into wrappers made here
+    if inner is not None and inner.wrapper is func:
+        contract = _Contract(inner.func, pre + inner.pre, inner.post + post, inner.invariant + invariant)
+    else:
+        contract = _Contract(func, pre, post, invariant)
+    return _make_wrapper(contract)
+
+
+## @endcond
+
+
+def contract(
+    pre: Iterable[Tuple[str, Tuple[str, ...], Callable[..., bool]]] = (),
+    post: Iterable[Tuple[str, Callable[..., bool]]] = (),
+    invariant: Iterable[Tuple[str, Callable[..., bool]]] = (),
+    *,
+    offload: Union[bool, str] = False,
+) -> Callable:
+    """!
+    Decorator to check several conditions of a function at once
+
+    The conditions are given like the arguments of ::precondition and ::postcondition;
+    invariants take the function's first argument (`self` for methods) and are checked before and after each call.
+    Preconditions are checked in order, then the invariants, then (after the call) the postconditions and invariants.
+
+    With `offload`, the pre- and postconditions are checked in the background: `True` or `"thread"` hands them
+    to a pool of threads, `"asyncio"` to the running event loop (or the threads, if there is none),
+    and violations are passed to the reporter configured in ::checks instead of being raised.
+    Offloaded conditions get the argument objects themselves, so they must not be mutated after the call.
+    Invariants, which look at the state of `self`, are always checked inline.
+
+    @param pre (description, arguments, condition) tuples, see ::precondition
+    @param post (description, condition) tuples, see ::postcondition
+    @param invariant (description, condition) tuples; condition gets the first argument of the function
+    @param offload whether and where to check the pre- and postconditions in the background
+    @return the decorator that checks the conditions
+
+    ## Example:
+    ```py
+    class Account:
+        def __init__(self, balance):
+            self.balance = balance
+
+        @contract(
+            pre=[("amount > 0", ("amount",), lambda amount: amount > 0)],
+            post=[("return >= 0", lambda res: res >= 0)],
+            invariant=[("balance >= 0", lambda self: self.balance >= 0)],
+        )
+        def withdraw(self, amount):
+            self.balance -= amount
+            return self.balance
+
+    Account(10).withdraw(5)  # returns 5
+    Account(10).withdraw(20)  # raises ValueError
+    ```
+    """
+    offload = checks.offload_mode(offload)
+    pre = [(description, c_args, condition, offload) for description, c_args, condition in pre]
+    post = [(description, condition, offload) for description, condition in post]
+    invariant = list(invariant)
+
+    def decorator(func):
+        if checks.stripped():
+            return func
+        return _merge(func, pre, post, invariant)
+
+    return decorator
 
 
 def precondition(
-    description: str, c_args: Tuple[str, ...], condition: Callable[..., bool], /
+    description: str,
+    c_args: Tuple[str, ...],
+    condition: Callable[..., bool],
+    /,
+    *,
+    offload: Union[bool, str] = False,
 ) -> Callable:
     """!
     Decorator to check one precondition of a function (chain to check multiple preconditions)
 
+    Arguments that aren't passed are given to the condition as their default value (None if there is none).
+    With `offload`, the condition is checked in the background, see ::contract.
+
     @param description: description of the precondition
     @param c_args: arguments of the function
     @param condition: condition to check
+    @param offload: whether and where to check the condition in the background
     @return the decorator that checks the precondition
 
     ## Example:
@@ -38,29 +242,21 @@ def precondition(
     f(-1, -1)  # raises ValueError
     ```
     """
-
-    def decorator(func):
-        sig = signature(func)
-
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            call = sig.bind(*args, **kwargs)
-            c_values = [call.arguments.get(arg, None) for arg in c_args]
-            if not condition(*c_values):
-                raise ValueError(f"{description} condition not satisfied")
-            return func(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+    return contract(pre=[(description, c_args, condition)], offload=offload)
 
 
-def postcondition(description: str, condition: Callable[..., bool], /) -> Callable:
+def postcondition(
+    description: str, condition: Callable[..., bool], /, *, offload: Union[bool, str] = False
+) -> Callable:
     """!
     Decorator to check return value of a function for one postcondition (chain for multiple)
 
+    If the condition has a `self` parameter, it is passed the `self` argument of the call as well.
+    With `offload`, the condition is checked in the background, see ::contract.
+
     @param description description of the postcondition
     @param condition condition to check
+    @param offload whether and where to check the condition in the background
     @return the decorator that checks the postcondition
 
     ## Example:
@@ -82,22 +278,4 @@ def postcondition(description: str, condition: Callable[..., bool], /) -> Callab
     f(-1, -1)  # raises ValueError
     ```
     """
-    c_sig = signature(condition)
-
-    def decorator(func):
-        f_sig = signature(func)
-
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            nonlocal condition
-            call = f_sig.bind(*args, **kwargs)
-            if "self" in c_sig.parameters:
-                condition = partial(condition, self=call.arguments["self"])
-            res = func(*args, **kwargs)
-            if not condition(res):
-                raise ValueError(f"{description} condition not satisfied")
-            return res
-
-        return wrapper
-
-    return decorator
+    return contract(post=[(description, condition)], offload=offload)
@@ -1,34 +1,253 @@
 """!
 Contains a decorator that allows you to convert parameters to the decorated function using converter functions.
 """
-from inspect import Signature, signature, Parameter, BoundArguments
-from typing import Callable, TypeVar, Tuple, Union
+from collections.abc import Mapping
+from inspect import Signature, signature, Parameter
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar, Union
 from functools import wraps, WRAPPER_ASSIGNMENTS
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-__all__ = ["convert"]
+
+__all__ = ["convert", "Stream"]
 
 
 ## @cond
 T = TypeVar("T")
+
+# the dtype kinds each scalar converter can convert with `astype` like calling it on every element,
+# as long as the values fit (see ::_fits_astype); booleans aren't converted from strings,
+# since numpy and `bool` disagree on which strings are true
+_ASTYPE_KINDS = {
+    int: "biufUS",
+    float: "biufUS",
+    complex: "biufc",
+    bool: "biuf",
+}
 ## @endcond
 
-def _convert_param(
-    name: str, bound: BoundArguments, param: Parameter
-) -> Union[T, Tuple[T]]:
+class Stream:
+    """!
+    A converter for iterable parameters of ::convert functions that converts their elements lazily.
+
+    A parameter annotated with `Stream[converter]` receives an iterator that converts each element
+    when it is consumed, so arbitrarily long iterables (like the lines of a file) pass through in constant memory.
+    On `*args`, each positional argument is streamed separately.
+
+    ## Example:
+    ```py
+    @convert
+    def total(numbers: Stream[int]) -> int:
+        return sum(numbers)
+
+    with open("numbers.txt") as f:
+        print(total(f))  # reads and converts one line at a time
+    ```
+    """
+
+    __slots__ = ("converter",)
+
+    def __init__(self, converter: Callable):
+        """!
+        @param converter the converter applied to every element
+        """
+        self.converter = converter
+
+    def __class_getitem__(cls, converter: Callable) -> "Stream":
+        return cls(converter)
+
+    def __call__(self, iterable: Iterable) -> Iterator:
+        return map(self.converter, iterable)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Stream) and other.converter == self.converter
+
+    def __hash__(self) -> int:
+        return hash((Stream, self.converter))
+
+    def __repr__(self) -> str:
+        return f"Stream[{getattr(self.converter, '__qualname__', None) or repr(self.converter)}]"
+
+
+def _converter(param: Parameter) -> Optional[Callable]:
+    """!
+    @return the converter of a parameter, or None if the parameter is passed through
+    """
     if isinstance(param.annotation, Callable) and param.annotation != Parameter.empty:
-        func = param.annotation
-    else:
+        return param.annotation
+    return None
+
 
-        def func(x):
-            return x
+class _Plan:
+    """!
+    The conversion plan of a function, computed once at decoration time:
+    the converter (or None) of every parameter and the layout of the parameters.
+    """
 
-    if param.kind == Parameter.VAR_POSITIONAL:
-        return (*map(func, bound.arguments[name]),)
-    elif param.kind == Parameter.VAR_KEYWORD:
-        return {k: func(v) for k, v in bound.arguments[name].items()}
-    else:
-        return func(bound.arguments[name])
+    def __init__(self, sig: Signature):
+        params = list(sig.parameters.values())
+        positional = [
+            p for p in params if p.kind in {Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD}
+        ]
+        ## the converters of the positional parameters, in order
+        self.positional = tuple(_converter(p) for p in positional)
+        ## the number of positional parameters without a default
+        self.required = sum(p.default is Parameter.empty for p in positional)
+        var_positional = [p for p in params if p.kind == Parameter.VAR_POSITIONAL]
+        var_keyword = [p for p in params if p.kind == Parameter.VAR_KEYWORD]
+        ## whether the function takes *args, and their converter
+        self.has_var_positional = bool(var_positional)
+        self.var_positional = _converter(var_positional[0]) if var_positional else None
+        ## whether the function takes **kwargs, and their converter
+        self.has_var_keyword = bool(var_keyword)
+        self.var_keyword = _converter(var_keyword[0]) if var_keyword else None
+        ## the converters of the parameters that can be passed by keyword
+        self.keyword = {
+            p.name: _converter(p)
+            for p in params
+            if p.kind in {Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY}
+        }
+        ## parameter name -> (kind, converter), for the parameters that have a converter
+        self.by_name = {p.name: (p.kind, _converter(p)) for p in params if _converter(p) is not None}
+        ## whether calls with positional arguments only can skip binding
+        self.fast = all(
+            p.default is not Parameter.empty for p in params if p.kind == Parameter.KEYWORD_ONLY
+        )
+        ## the converter of the return value
+        self.returns = (
+            sig.return_annotation
+            if isinstance(sig.return_annotation, Callable)
+            and sig.return_annotation != Signature.empty
+            else None
+        )
+
+
+def _fits_astype(converter: Callable, column: Any) -> bool:
+    """!
+    @return whether `column.astype(converter)` gives the values calling `converter` would;
+    casting to int64 doesn't raise for values it can't hold, but silently wraps them or makes up a value
+    """
+    if converter is not int or column.size == 0:
+        return True
+    if column.dtype.kind == "f":
+        # also rules out nan and infinities, for which int raises
+        return bool((numpy.abs(column) < 2.0 ** 63).all())
+    if column.dtype.kind == "u" and column.dtype.itemsize >= 8:
+        return int(column.max()) <= numpy.iinfo(numpy.int64).max
+    return True
+
+
+def _convert_column(converter: Optional[Callable], column: Iterable, vectorized: bool):
+    """!
+    Converts a whole column of arguments at once.
+
+    NumPy arrays are converted with a single `astype` if the converter is a scalar type that allows it;
+    unless the result is passed to a vectorized call, it is turned back into python objects with `tolist`.
+    """
+    if converter is None:
+        return column if vectorized else list(column)
+    if (
+        numpy is not None
+        and isinstance(column, numpy.ndarray)
+        and column.dtype.kind in _ASTYPE_KINDS.get(converter, "")
+        and _fits_astype(converter, column)
+    ):
+        try:
+            converted = column.astype(converter)
+        except (ValueError, OverflowError):
+            pass  # let the converter raise the proper error below
+        else:
+            return converted if vectorized else converted.tolist()
+    return list(map(converter, column))
+
+
+def _add_batch_api(wrapper: Callable, f: Callable, plan: _Plan):
+    """!
+    Adds `batch` and `map` to a converted function.
+    """
+
+    def positional_converter(i: int) -> Optional[Callable]:
+        if i < len(plan.positional):
+            return plan.positional[i]
+        if not plan.has_var_positional:
+            raise TypeError(f"{f.__qualname__}() takes {len(plan.positional)} positional arguments")
+        return plan.var_positional
+
+    def keyword_converter(name: str) -> Optional[Callable]:
+        if name in plan.keyword:
+            return plan.keyword[name]
+        if not plan.has_var_keyword:
+            raise TypeError(f"{f.__qualname__}() got an unexpected keyword argument {name!r}")
+        return plan.var_keyword
+
+    def convert_result(result):
+        if plan.returns is None:
+            return result
+        if isinstance(result, tuple):
+            return plan.returns(*result)
+        return plan.returns(result)
+
+    def batch(*columns: Iterable, vectorized: bool = False, **keyword_columns: Iterable) -> Any:
+        """!
+        Calls the function for every row of the given columns, converting each column at once.
+
+        @param columns the columns of the positional arguments
+        @param vectorized whether to call the function once with the whole converted columns
+        @param keyword_columns the columns of the keyword arguments
+        @return the list of results, or the single result of a vectorized call
+        @throws ValueError if the columns have different lengths
+        """
+        converted = [
+            _convert_column(positional_converter(i), column, vectorized)
+            for i, column in enumerate(columns)
+        ]
+        converted_keywords = {
+            name: _convert_column(keyword_converter(name), column, vectorized)
+            for name, column in keyword_columns.items()
+        }
+        lengths = {
+            len(column) for column in (*converted, *converted_keywords.values()) if hasattr(column, "__len__")
+        }
+        if len(lengths) > 1:
+            raise ValueError(f"the columns have different lengths: {sorted(lengths)}")
+        if vectorized:
+            return convert_result(f(*converted, **converted_keywords))
+        names = list(converted_keywords)
+        rows = zip(*converted, *converted_keywords.values())
+        n = len(converted)
+        if not names:
+            return [convert_result(f(*row)) for row in rows]
+        return [convert_result(f(*row[:n], **dict(zip(names, row[n:])))) for row in rows]
+
+    def map_(rows: Iterable[Union[tuple, Mapping]], chunksize: int = 4096) -> Iterator:
+        """!
+        Lazily calls the function for every row, converting the rows in chunks of columns (see `batch`).
+
+        @param rows tuples of positional arguments, or mappings of keyword arguments
+        @param chunksize the number of rows converted at once
+        @return an iterator over the results
+        @throws ValueError if a row has other keys, or another length, than the first one
+        """
+        rows = iter(rows)
+        shape = None
+        while chunk := list(islice(rows, chunksize)):
+            if shape is None:
+                shape = set(chunk[0]) if isinstance(chunk[0], Mapping) else len(chunk[0])
+            for row in chunk:
+                if (set(row) if isinstance(shape, set) else len(row)) != shape:
+                    raise ValueError(f"row {row!r} doesn't have the shape of the first row")
+            if isinstance(shape, set):
+                yield from batch(**{name: [row[name] for row in chunk] for name in shape})
+            else:
+                yield from batch(*zip(*chunk))
+
+    wrapper.batch = batch
+    wrapper.map = map_
+    return wrapper
 
 
 def convert(f: Callable):
@@ -50,6 +269,11 @@ def convert(f: Callable):
 
     If a converter can't run with exactly one argument, it raises a `TypeError` on call.
 
+    ## conversion plan
+    Which parameters have converters, and how the parameters are laid out, is worked out once when decorating.
+    Calls with only positional arguments then just apply the existing converters;
+    other calls are bound to the signature first. Parameters that aren't passed keep their (unconverted) default.
+
     If a return annotation is given and callable, and the return value of the wrapped function is a tuple,
     the annotation will be called with the elements of the return value.
 
@@ -65,34 +289,44 @@ def convert(f: Callable):
     ```
     """
     sig = signature(f)
+    plan = _Plan(sig)
+    positional, n_positional, required = plan.positional, len(plan.positional), plan.required
+    identity = all(c is None for c in positional)
+    has_var_positional, var_positional = plan.has_var_positional, plan.var_positional
+    fast, by_name, returns = plan.fast, plan.by_name, plan.returns
 
     @wraps(f, [i for i in WRAPPER_ASSIGNMENTS if i != "__annotations__"])
     def wrapper(*args, **kwargs):
-        bound = sig.bind(*args, **kwargs)
-        converted_args = tuple(
-            _convert_param(k, bound, v)
-            for k, v in sig.parameters.items()
-            if v.kind == Parameter.POSITIONAL_ONLY
-        )
-        var_keyword = {}
-        for name, p in sig.parameters.items():
-            if p.kind == Parameter.VAR_KEYWORD:
-                var_keyword = _convert_param(name, bound, p)
-                break
-        converted_kwargs = {
-            k: _convert_param(k, bound, v)
-            for k, v in sig.parameters.items()
-            if v.kind in {Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY}
-        } | var_keyword
-        result = f(*converted_args, **converted_kwargs)
-
-        if (
-            isinstance(sig.return_annotation, Callable)
-            and sig.return_annotation != Signature.empty
-        ):
-            if isinstance(result, tuple):
-                return sig.return_annotation(*result)
-            return sig.return_annotation(result)
-        return result
+        n = len(args)
+        if not kwargs and fast and required <= n and (n <= n_positional or has_var_positional):
+            # only positional arguments: no need to bind them to find out which converter to use
+            if identity:
+                converted = args[:n_positional]
+            else:
+                converted = [a if c is None else c(a) for c, a in zip(positional, args)]
+            if n > n_positional:
+                rest = args[n_positional:]
+                converted = (*converted, *(rest if var_positional is None else map(var_positional, rest)))
+            result = f(*converted)
+        else:
+            bound = sig.bind(*args, **kwargs)
+            arguments = bound.arguments
+            for name, value in arguments.items():
+                if name not in by_name:
+                    continue
+                kind, converter = by_name[name]
+                if kind == Parameter.VAR_POSITIONAL:
+                    arguments[name] = (*map(converter, value),)
+                elif kind == Parameter.VAR_KEYWORD:
+                    arguments[name] = {k: converter(v) for k, v in value.items()}
+                else:
+                    arguments[name] = converter(value)
+            result = f(*bound.args, **bound.kwargs)
 
-    return wrapper
+        if returns is None:
+            return result
+        if isinstance(result, tuple):
+            return returns(*result)
+        return returns(result)
+
+    return _add_batch_api(wrapper, f, plan)
@@ -1,17 +1,135 @@
 """!
 This module contains a factory decorator.
 """
+import asyncio
+import sys
+from collections import deque
 from functools import wraps
-from inspect import signature, Parameter
-from typing import Callable, Any
+from inspect import isawaitable, iscoroutinefunction, signature, Parameter
+from threading import Condition, Lock, local
+from typing import Callable, Any, Optional
 
-__all__ = "param_factory"
+__all__ = ["param_factory"]
 
 
-def param_factory(name: str, factory: Callable[[], Any]):
+## @cond
+SCOPES = ("call", "thread")
+_CREATE = object()
+_MISSING = object()
+
+
+def _wake_future(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+class _Pool:
+    """!
+    A bounded pool of factory-made objects, created on demand.
+
+    Threads wait for a free object on a condition, coroutines on a future of their event loop;
+    every returned object wakes one of each, and whoever comes second waits again.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int):
+        self.factory = factory
+        self.size = size
+        self.idle = []
+        self.created = 0
+        self.lock = Lock()
+        self.available = Condition(self.lock)
+        self.waiters = deque()
+
+    def _take(self) -> Any:
+        # called with the lock held
+        if self.idle:
+            return self.idle.pop()
+        if self.created < self.size:
+            self.created += 1
+            return _CREATE
+        return _MISSING
+
+    def _wake(self):
+        # called with the lock held
+        self.available.notify()
+        while self.waiters:
+            loop, fut = self.waiters.popleft()
+            if not fut.done():
+                loop.call_soon_threadsafe(_wake_future, fut)
+                break
+
+    def _failed(self):
+        with self.lock:
+            self.created -= 1
+            self._wake()
+
+    def acquire(self) -> Any:
+        with self.lock:
+            obj = self._take()
+            while obj is _MISSING:
+                self.available.wait()
+                obj = self._take()
+        if obj is _CREATE:
+            try:
+                obj = self.factory()
+            except BaseException:
+                self._failed()
+                raise
+        return obj
+
+    async def acquire_async(self) -> Any:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.lock:
+                obj = self._take()
+                if obj is _MISSING:
+                    fut = loop.create_future()
+                    self.waiters.append((loop, fut))
+            if obj is not _MISSING:
+                break
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # pass on the wake-up this waiter may have received
+                with self.lock:
+                    self._wake()
+                raise
+        if obj is _CREATE:
+            try:
+                obj = self.factory()
+                if isawaitable(obj):
+                    obj = await obj
+            except BaseException:
+                self._failed()
+                raise
+        return obj
+
+    def release(self, obj: Any):
+        with self.lock:
+            self.idle.append(obj)
+            self._wake()
+
+
+## @endcond
+
+
+def param_factory(
+    name: str,
+    factory: Callable[[], Any],
+    *,
+    pool: Optional[int] = None,
+    scope: str = "call",
+):
     """!
     Add a factory for a parameter of the decorated function
 
+    By default (`scope="call"`), the factory is called on every call that doesn't pass the parameter.
+    With `scope="thread"`, it is called once per thread and the object is reused by later calls in that thread.
+    With `pool=N`, up to N objects are made on demand and lent to one call at a time,
+    returning to the pool when the call is done; calls wait while all of them are in use.
+
+    The factory may be a coroutine function if the decorated function is one too.
+
     ## Example usage:
     ```py
     @param_factory('test', lambda: 5)
@@ -20,17 +138,31 @@ def param_factory(name: str, factory: Callable[[], Any]):
 
     print(mul2(10))  # -> 20
     print(mul2())    # -> 10
+
+    @param_factory('conn', connect, pool=4)
+    def query(sql, conn):
+        return conn.execute(sql)
     ```
 
     @param name the name of the parameter to add a factory to
     @param factory the factory to produce values for the parameter
+    @param pool the size of a pool of reused objects, None to make one per call
+    @param scope "call" or "thread", how long an object made by the factory is used
     """
+    if scope not in SCOPES:
+        raise ValueError(f"invalid scope {scope!r}, expected one of {', '.join(map(repr, SCOPES))}")
+    if pool is not None:
+        if scope != "call":
+            raise ValueError("a pool can only be used with scope='call'")
+        if pool < 1:
+            raise ValueError(f"the pool size must be at least 1, got {pool}")
 
     def decorator(f: Callable):
         sig = signature(f)
+        is_async = iscoroutinefunction(f)
 
         if name not in sig.parameters and not any(
-            t == Parameter.VAR_KEYWORD for t in sig.parameters.values()
+            par.kind == Parameter.VAR_KEYWORD for par in sig.parameters.values()
         ):
             raise TypeError(
                 "Can't add a factory for a parameter that doesn't exist without **kwargs"
@@ -39,11 +171,87 @@ def param_factory(name: str, factory: Callable[[], Any]):
         if name in sig.parameters and sig.parameters[name].kind == Parameter.POSITIONAL_ONLY:
             raise TypeError("Can't add a factory for a positional-only parameter")
 
+        if iscoroutinefunction(factory) and not is_async:
+            raise TypeError("Can't add an async factory to a function that isn't async")
+
+        # the parameter is passed if it's in the keyword arguments or there are enough positional ones
+        position = sys.maxsize
+        for i, par in enumerate(sig.parameters.values()):
+            if par.name == name and par.kind == Parameter.POSITIONAL_OR_KEYWORD:
+                position = i
+                break
+            if par.kind not in {Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD}:
+                break
+
+        if pool is not None:
+            objects = _Pool(factory, pool)
+
+            if is_async:
+
+                @wraps(f)
+                async def inner(*args, **kwargs):
+                    if name in kwargs or len(args) > position:
+                        return await f(*args, **kwargs)
+                    obj = kwargs[name] = await objects.acquire_async()
+                    try:
+                        return await f(*args, **kwargs)
+                    finally:
+                        objects.release(obj)
+
+                return inner
+
+            @wraps(f)
+            def inner(*args, **kwargs):
+                if name in kwargs or len(args) > position:
+                    return f(*args, **kwargs)
+                obj = kwargs[name] = objects.acquire()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    objects.release(obj)
+
+            return inner
+
+        if scope == "thread":
+            per_thread = local()
+
+            def make():
+                obj = per_thread.__dict__.get("obj", _MISSING)
+                if obj is _MISSING:
+                    obj = per_thread.obj = factory()
+                return obj
+
+            async def make_async():
+                obj = per_thread.__dict__.get("obj", _MISSING)
+                if obj is _MISSING:
+                    obj = factory()
+                    if isawaitable(obj):
+                        obj = await obj
+                    per_thread.obj = obj
+                return obj
+
+        else:
+            make = factory
+
+            async def make_async():
+                obj = factory()
+                return await obj if isawaitable(obj) else obj
+
+        if is_async:
+
+            @wraps(f)
+            async def inner(*args, **kwargs):
+                if name not in kwargs and len(args) <= position:
+                    kwargs[name] = await make_async()
+                return await f(*args, **kwargs)
+
+            return inner
+
         @wraps(f)
         def inner(*args, **kwargs):
-            bound = sig.bind_partial(*args, **kwargs)
-            rest = {name: factory()} if name not in bound.arguments else {}
-            return f(*bound.args, **bound.kwargs, **rest)
+            if name not in kwargs and len(args) <= position:
+                kwargs[name] = make()
+            return f(*args, **kwargs)
 
         return inner
 
@@ -1,13 +1,20 @@
 """!
 Adds the ability to overload functions
 """
-from inspect import signature, Signature
+from abc import ABCMeta, get_cache_token
+from inspect import signature, Signature, Parameter
 from collections import defaultdict
 from functools import wraps
-from typing import Callable, MutableMapping
+from typing import Callable, MutableMapping, Optional, Tuple, Union, get_args, get_origin
 from types import FunctionType
+from utils.types_.is_instance import _is_plain_class
 from .strict import is_empty
 
+try:
+    from types import UnionType
+except ImportError:  # Python < 3.10
+    UnionType = Union
+
 
 __all__ = ["overload"]
 
@@ -29,6 +36,90 @@ def to_string(args, kwargs) -> str:
     )
 
 
+## marks argument types that can only be dispatched by looking at the values
+_BY_VALUE = object()
+## marks argument types that no overload accepts
+_NO_MATCH = object()
+
+
+def _classes(annotation) -> Optional[Tuple[type, ...]]:
+    """!
+    @return the classes `annotation` stands for if an isinstance check against it only depends
+    on the type of the checked object, otherwise None
+    """
+    if get_origin(annotation) in {Union, UnionType}:
+        annotation = get_args(annotation)
+    else:
+        annotation = (annotation,)
+    if all(map(_is_plain_class, annotation)):
+        return annotation
+    return None
+
+
+class _DispatchTable:
+    """!
+    Caches which implementation of an overloaded function a tuple of positional argument types
+    resolves to, like `functools.singledispatch` does for one argument.
+
+    Annotations whose instance check depends on the value (like `NaturalNumber`) can't be resolved
+    from the types alone; argument types reaching such an annotation are marked for the slow path.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.resolved = {}
+        self.uses_abc = False
+        self.token = None
+
+    def invalidate(self):
+        self.resolved.clear()
+        self.uses_abc = any(
+            isinstance(cls, ABCMeta)
+            for sig in overloaded[self.name]
+            for param in sig.parameters.values()
+            for cls in _classes(param.annotation) or ()
+        )
+        self.token = get_cache_token() if self.uses_abc else None
+
+    def lookup(self, types: Tuple[type, ...]):
+        if self.uses_abc and self.token != get_cache_token():
+            self.invalidate()
+        try:
+            return self.resolved[types]
+        except KeyError:
+            pass
+        res = self.resolved[types] = self._resolve(types)
+        return res
+
+    def _resolve(self, types: Tuple[type, ...]):
+        for sig, func in overloaded[self.name].items():
+            try:
+                arguments = sig.bind(*types).arguments
+            except TypeError:
+                continue
+            for k, v in arguments.items():
+                param = sig.parameters[k]
+                try:
+                    if is_empty(param.annotation):
+                        continue
+                except TypeError:
+                    return _BY_VALUE
+                classes = _classes(param.annotation)
+                if classes is None:
+                    return _BY_VALUE
+                if param.kind == Parameter.VAR_POSITIONAL:
+                    # the annotation of *args is checked against the whole tuple
+                    v = tuple
+                if not issubclass(v, classes):
+                    break
+            else:
+                return func
+        return _NO_MATCH
+
+
+_tables: MutableMapping[str, _DispatchTable] = {}
+
+
 ## @endcond
 
 
@@ -42,6 +133,11 @@ def overload(f: FunctionType):
     Keep in mind that all implementations need to be decorated with `@overload` to be considered.
     If there are multiple implementations for the same signature and annotations, only the last one is considered.
 
+    Calls with only positional arguments are dispatched through a table from the tuple of argument types
+    to the implementation, which is filled on first use and reset whenever an implementation is added.
+    Calls with keyword arguments, and annotations that depend on the value rather than the type,
+    check every implementation in order.
+
     ## Example:
     ```py
     @overload
@@ -54,17 +150,19 @@ def overload(f: FunctionType):
 
     f(12)  # prints "x is an int"
     f('test')  # prints "x is a string"
-    f(1.2)  # raises a TypeError('No overloads for f with arguments: (1.2, )')
+    f(1.2)  # raises a ValueError('No overloads for f with arguments: (1.2, )')
     ```
 
     @param f the overloaded function
     """
     name = f"{f.__module__}.{f.__qualname__}"
     overloaded[name][signature(f)] = f
+    table = _tables.get(name)
+    if table is None:
+        table = _tables[name] = _DispatchTable(name)
+    table.invalidate()
 
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        to_call = None
+    def dispatch(args, kwargs):
         for sig, func in overloaded[name].items():
             try:
                 arguments = sig.bind(*args, **kwargs)
@@ -73,13 +171,24 @@ def overload(f: FunctionType):
                     or isinstance(v, sig.parameters[k].annotation)
                     for k, v in arguments.arguments.items()
                 ):
-                    to_call = func
-                    return to_call(*args, **kwargs)
+                    return func
             except TypeError:
                 continue
-        if to_call is None:
+        raise ValueError(
+            f"No overloads for {name} with arguments: {to_string(args, kwargs)}"
+        )
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        if kwargs:
+            return dispatch(args, kwargs)(*args, **kwargs)
+        to_call = table.lookup(tuple(map(type, args)))
+        if to_call is _BY_VALUE:
+            to_call = dispatch(args, kwargs)
+        elif to_call is _NO_MATCH:
             raise ValueError(
                 f"No overloads for {name} with arguments: {to_string(args, kwargs)}"
             )
+        return to_call(*args, **kwargs)
 
     return wrapper
@@ -1,22 +1,200 @@
 """!
 Adds a way to template classes
 """
-from typing import Type, TypeVar, Callable
+import ast
+import copyreg
+import inspect
+import textwrap
+from types import FunctionType
+from typing import Any, Iterable, Optional, Type, TypeVar, Callable
 from functools import lru_cache
 
+from utils.cache import cached
+
 __all__ = ["template"]
 
 ## @cond
 T = TypeVar("T")
+
+
+def _instantiate(wrapper: Callable[..., type], params: dict) -> type:
+    # how pickle recreates a template instantiation: through the cache of the unpickling process
+    return wrapper(**params)
+
+
+def _reduce_class(cls: type) -> Any:
+    template_ = cls.__dict__.get("__template__")
+    if template_ is None:
+        # a class derived from an instantiation, pickled by name as usual
+        return cls.__qualname__
+    return _instantiate, template_
+
+
+@lru_cache(None)
+def _templated_meta(meta: type) -> type:
+    """!
+    @return a subclass of the metaclass `meta` that pickles its classes by template and parameters
+    """
+    derived = meta(f"Templated{meta.__name__}", (meta,), {"__module__": __name__})
+    copyreg.pickle(derived, _reduce_class)
+    return derived
+
+
+class _Specializer(ast.NodeTransformer):
+    """!
+    Replaces reads of `<first argument>.<parameter>` with reads of a variable holding the parameter.
+    """
+
+    def __init__(self, self_name: str, params: Iterable[str]):
+        self.self_name = self_name
+        self.params = set(params)
+        self.replaced = False
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        if (
+            isinstance(node.ctx, ast.Load)
+            and node.attr in self.params
+            and isinstance(node.value, ast.Name)
+            and node.value.id == self.self_name
+        ):
+            self.replaced = True
+            return ast.copy_location(ast.Name(id=f"_template_{node.attr}", ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def _specialize_function(f: FunctionType, params: dict, cell_class: list) -> Optional[FunctionType]:
+    """!
+    Recompiles `f` with the template parameters it reads through its first argument turned into closure variables.
+
+    Only the function's own variables and `__class__` (for `super()`) can be carried over, so functions
+    with other free variables, wrappers made by other decorators (with `__wrapped__`, or whose source is elsewhere)
+    and functions without source are left alone.
+    Defaults and annotations are copied from `f` rather than evaluated again.
+
+    @param cell_class receives the cell of `__class__`, to be filled in when the class exists
+    @return the specialized function, or None if `f` can't be specialized or reads no parameters
+    (functions using `super()` are always recompiled, so that it refers to the instantiation)
+    """
+    code = f.__code__
+    # getsource follows __wrapped__, which would replace a wrapper (like a compiled ::strict one) by what it wraps
+    if code.co_argcount == 0 or set(code.co_freevars) - {"__class__"} or hasattr(f, "__wrapped__"):
+        return None
+    try:
+        lines, first_line = inspect.getsourcelines(f)
+        filename = inspect.getsourcefile(f) or "<template>"
+    except (OSError, TypeError):
+        return None
+    if first_line != code.co_firstlineno or filename != code.co_filename:
+        # the source found isn't the one `f` was compiled from
+        return None
+    source = textwrap.dedent("".join(lines))
+    try:
+        node = ast.parse(source).body[0]
+    except SyntaxError:  # e.g. a lambda in the middle of an expression
+        return None
+    if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) or node.name != code.co_name:
+        return None
+    specializer = _Specializer(code.co_varnames[0], params)
+    node = specializer.visit(node)
+    if not specializer.replaced and "__class__" not in code.co_freevars:
+        return None
+
+    # evaluating them again could fail outside the class body; the originals are copied below
+    node.decorator_list = []
+    node.returns = None
+    arguments = node.args
+    for arg in [*arguments.posonlyargs, *arguments.args, *arguments.kwonlyargs, arguments.vararg, arguments.kwarg]:
+        if arg is not None:
+            arg.annotation = None
+    arguments.defaults = [ast.Constant(None) for _ in arguments.defaults]
+    arguments.kw_defaults = [None if d is None else ast.Constant(None) for d in arguments.kw_defaults]
+
+    factory_params = [ast.arg(f"_template_{name}") for name in params]
+    if "__class__" in code.co_freevars:
+        factory_params.append(ast.arg("__class__"))
+    factory = ast.FunctionDef(
+        name="_template_factory",
+        args=ast.arguments(posonlyargs=[], args=factory_params, kwonlyargs=[], kw_defaults=[], defaults=[]),
+        body=[node, ast.Return(ast.Name(id=node.name, ctx=ast.Load()))],
+        decorator_list=[],
+        returns=None,
+        # Python 3.12+
+        **({"type_params": []} if "type_params" in ast.FunctionDef._fields else {}),
+    )
+    module = ast.Module(body=[factory], type_ignores=[])
+    ast.fix_missing_locations(module)
+    ast.increment_lineno(module, code.co_firstlineno - 1)
+    namespace = {}
+    exec(compile(module, filename, "exec"), f.__globals__, namespace)
+    args = list(params.values())
+    if "__class__" in code.co_freevars:
+        args.append(None)
+    new = namespace["_template_factory"](*args)
+    if "__class__" in new.__code__.co_freevars:
+        cell_class.append(new.__closure__[new.__code__.co_freevars.index("__class__")])
+
+    new.__name__ = f.__name__
+    new.__qualname__ = f.__qualname__
+    new.__module__ = f.__module__
+    new.__doc__ = f.__doc__
+    new.__defaults__ = f.__defaults__
+    new.__kwdefaults__ = f.__kwdefaults__
+    new.__annotations__ = f.__annotations__
+    new.__dict__.update(f.__dict__)
+    return new
+
+
+def _specialize(namespace: dict, params: dict) -> list:
+    """!
+    Specializes the methods, class methods and property functions of a class namespace in place.
+
+    @return the `__class__` cells of the specialized functions
+    """
+    cells = []
+
+    def specialize(f):
+        if not isinstance(f, FunctionType):
+            return f
+        new = _specialize_function(f, params, cells)
+        return f if new is None else new
+
+    for key, value in namespace.items():
+        if isinstance(value, FunctionType):
+            namespace[key] = specialize(value)
+        elif isinstance(value, classmethod):
+            namespace[key] = classmethod(specialize(value.__func__))
+        elif isinstance(value, property):
+            namespace[key] = property(
+                specialize(value.fget), specialize(value.fset), specialize(value.fdel), value.__doc__
+            )
+    return cells
+
+
 ## @endcond
 
 
-def template(*args: str):
+def template(*args: str, maxsize: Optional[int] = None, specialize: bool = False):
     """!
     A class template decorator.
 
     This decorator is supposed to act similarly to C++'s `template` keyword for classes.
 
+    Instantiations are cached by their parameters (which don't need to be hashable, see ::cached,
+    though hashable ones are looked up faster),
+    so instantiating a template twice with the same parameters gives the same class;
+    `maxsize` bounds the cache, at the price of recreating evicted instantiations as new classes.
+    The statistics of the cache are returned by the template's `cache_info()`.
+
+    The instantiated classes, and therefore their instances, can be pickled: they are stored as
+    a reference to the template and the parameters, and instantiated again when unpickled,
+    so instances can be sent to other processes (like the workers of a `ProcessPoolExecutor`).
+
+    With `specialize`, the methods (and class methods and properties) of every instantiation are recompiled
+    from their source with reads of `self.<parameter>` replaced by closure variables holding the parameters,
+    like C++ compiles every instantiation separately, which saves the attribute lookups in tight loops.
+    The parameters are then constant for the methods, even if an instance attribute of the same name is set.
+    Methods without source, and methods wrapped by other decorators, keep reading the attributes.
+
     Example:
 
     ```py
@@ -27,23 +205,66 @@ def template(*args: str):
 
     example = Example(test=12)()
     print(example.f())  # prints 12
+    pickle.loads(pickle.dumps(example)).f()  # 12
     ```
     @param args the template parameter names
+    @param maxsize the maximum number of cached instantiations, None for no limit
+    @param specialize whether to compile the parameters into the methods of the instantiations
     """
 
     def decorator(cls: Type) -> Callable[..., type]:
-        @lru_cache(None)
-        def wrapper(**kwargs):
-            masked = {k: v for k, v in kwargs.items() if k in args}
+        meta = _templated_meta(type(cls))
+        namespace = dict(cls.__dict__)
+        # the descriptors of the template's instance dict don't work on other classes
+        namespace.pop("__dict__", None)
+        namespace.pop("__weakref__", None)
+
+        @cached(maxsize=maxsize, thread_safe=True)
+        def instantiate(**masked):
             name = (
                 f"{cls.__qualname__}("
                 + ", ".join(f"{k}={v}" for k, v in masked.items())
                 + ")"
             )
-            meta = type(cls)
-            actual = meta(name, tuple(cls.mro())[1:], cls.__dict__ | masked)
+            own = dict(namespace)
+            cells = _specialize(own, masked) if specialize else ()
+            actual = meta(name, cls.__bases__, own | masked)
+            actual.__template__ = (wrapper, masked)
+            for cell in cells:
+                # zero-argument super() in a specialized method refers to the instantiation
+                cell.cell_contents = actual
             return actual
 
+        @lru_cache(maxsize)
+        def lookup(key: tuple) -> type:
+            return instantiate(**dict(key))
+
+        def wrapper(**kwargs):
+            # in declaration order, so that the order of the keywords doesn't matter
+            masked = {k: kwargs[k] for k in args if k in kwargs}
+            key = tuple(masked.items())
+            try:
+                hash(key)
+            except TypeError:
+                return instantiate(**masked)
+            # the single-flight cache behind it still makes sure each instantiation is created once
+            return lookup(key)
+
+        def cache_info():
+            fast, slow = lookup.cache_info(), instantiate.cache_info()
+            return slow._replace(hits=fast.hits + slow.hits)
+
+        def cache_clear():
+            lookup.cache_clear()
+            instantiate.cache_clear()
+
+        # pickle finds the template by these, since it replaces the class in its module
+        wrapper.__module__ = cls.__module__
+        wrapper.__name__ = cls.__name__
+        wrapper.__qualname__ = cls.__qualname__
+        wrapper.__doc__ = cls.__doc__
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
         return wrapper
 
     return decorator
@@ -0,0 +1,233 @@
+"""!
+Contains a columnar ("struct of arrays") container for instances of slotted classes.
+"""
+from array import array
+from inspect import signature
+from operator import attrgetter
+from typing import Any, Dict, Iterable, Iterator, Optional, Union, get_type_hints
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['SlotArray']
+
+## @cond
+## array type codes of annotations that can be stored in typed columns
+_TYPECODES = {int: 'q', float: 'd', bool: 'B'}
+
+
+def _slots(cls: type) -> tuple:
+    """!
+    @return the slots of `cls` and its base classes, base classes first
+    """
+    names = []
+    for klass in reversed(cls.__mro__):
+        own = klass.__dict__.get('__slots__', ())
+        for name in (own,) if isinstance(own, str) else own:
+            if name not in {'__dict__', '__weakref__'} and name not in names:
+                names.append(name)
+    return tuple(names)
+
+
+def _annotations(cls: type) -> Dict[str, Any]:
+    """!
+    @return the annotations of the class' attributes, and of the `__init__` parameters of the same name
+    """
+    hints = {}
+    try:
+        hints = {name: par.annotation for name, par in signature(cls.__init__).parameters.items()}
+    except (TypeError, ValueError):
+        pass
+    try:
+        hints.update(get_type_hints(cls))
+    except Exception:  # unresolvable forward references only cost the typed column
+        pass
+    return hints
+
+
+def _column_property(name: str, is_bool: bool) -> property:
+    def get(self):
+        value = self._array._columns[name][self._index]
+        return bool(value) if is_bool else value
+
+    def set(self, value):
+        self._array._columns[name][self._index] = value
+
+    return property(get, set, doc=f"the {name} column of the viewed row")
+
+
+def _view_class(cls: type, names: Iterable[str], bools: Iterable[str]) -> type:
+    """!
+    Creates a subclass of `cls` whose instances are views of one row of a ::SlotArray:
+    its slots are replaced by properties reading and writing the columns, so methods of `cls` work on views.
+    """
+    namespace = {name: _column_property(name, name in bools) for name in names}
+    namespace['__slots__'] = ('_array', '_index')
+    namespace['__module__'] = cls.__module__
+    namespace['__qualname__'] = f"{cls.__qualname__}.View"
+    return type(cls)(f"{cls.__name__}View", (cls,), namespace)
+
+
+## @endcond
+
+
+class SlotArray:
+    """!
+    Stores instances of a slotted class (like one made with ::auto_slots) as one column per slot.
+
+    Slots annotated as `int`, `float` or `bool` (on the class, or as the `__init__` parameter of the same name)
+    are stored in typed `array.array` columns, taking 8 bytes per `int` or `float`, instead of an object
+    and a pointer per value and a 50+ byte object per instance; other slots are stored in lists.
+    `types` overrides the column of a slot with an array type code, or None for a list.
+
+    Indexing returns a view of the row, an instance of a subclass of `cls` whose attributes read and write
+    the columns, so the methods of `cls` work on it. Views refer to a position, so they see different
+    values after rows before them were deleted.
+
+    Typed columns only take values the array type can hold, so storing `None` or an out of range integer
+    raises a TypeError or OverflowError, and every slot must be set on the stored objects.
+
+    ## Example:
+    ```py
+    @auto_slots
+    class Point:
+        def __init__(self, x: float, y: float, label: str):
+            self.x = x
+            self.y = y
+            self.label = label
+
+        def norm(self):
+            return (self.x ** 2 + self.y ** 2) ** 0.5
+
+    points = SlotArray(Point)
+    points.extend(Point(i, i, str(i)) for i in range(1_000_000))
+    points[3].norm()  # 4.24...
+    sum(points.column('x'))  # 499999500000.0
+    points.column('x', as_numpy=True).mean()  # without copying
+    ```
+    """
+
+    def __init__(
+        self,
+        cls: type,
+        items: Iterable = (),
+        types: Optional[Dict[str, Optional[str]]] = None,
+    ):
+        """!
+        @param cls the class of the stored objects, which must have `__slots__`
+        @param items objects to store initially
+        @param types array type codes for some slots (None for a list), overriding their annotations
+        """
+        if '__slots__' not in cls.__dict__:
+            raise TypeError(f"{cls.__qualname__} has no __slots__, decorate it with auto_slots first")
+        self.cls = cls
+        annotations = _annotations(cls)
+        self._columns = {}
+        # bools are stored as bytes, and converted back when read
+        self._bools = set()
+        for name in _slots(cls):
+            if types is not None and name in types:
+                code = types[name]
+            else:
+                code = _TYPECODES.get(annotations.get(name))
+                if code == 'B':
+                    self._bools.add(name)
+            self._columns[name] = array(code) if code else []
+        self._view = _view_class(cls, self._columns, self._bools)
+        self._length = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _row(self, index: int) -> int:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("SlotArray index out of range")
+        return index
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            res = object.__new__(SlotArray)
+            res.__dict__.update(self.__dict__)
+            res._columns = {name: column[index] for name, column in self._columns.items()}
+            res._length = len(range(*index.indices(len(self))))
+            return res
+        view = object.__new__(self._view)
+        view._array = self
+        view._index = self._row(index)
+        return view
+
+    def __setitem__(self, index: int, obj: Any):
+        index = self._row(index)
+        values = [(name, getattr(obj, name)) for name in self._columns]
+        for name, value in values:
+            self._columns[name][index] = value
+
+    def __delitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            removed = len(range(*index.indices(len(self))))
+        else:
+            index, removed = self._row(index), 1
+        for column in self._columns.values():
+            del column[index]
+        self._length -= removed
+
+    def __iter__(self) -> Iterator:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f"SlotArray({self.cls.__qualname__}, {len(self)} items)"
+
+    def append(self, obj: Any):
+        """!
+        Stores the slots of `obj` in a new row.
+        """
+        self.extend((obj,))
+
+    def extend(self, items: Iterable):
+        """!
+        Stores the slots of all `items` in new rows, one column at a time;
+        if a value doesn't fit its column (or a column can't grow, see ::column), no row is added.
+        """
+        items = items if isinstance(items, (list, tuple)) else list(items)
+        n = len(self)
+        try:
+            for name, column in self._columns.items():
+                column.extend(map(attrgetter(name), items))
+        except BaseException:
+            for column in self._columns.values():
+                # an exported column raises a BufferError on any resize, even one that changes nothing
+                if len(column) > n:
+                    del column[n:]
+            raise
+        self._length = n + len(items)
+
+    def column(self, name: str, as_numpy: bool = False):
+        """!
+        @param name the name of a slot
+        @param as_numpy whether to return a NumPy array sharing the memory of a typed column;
+        as long as it (or any other buffer export of the column) is alive, the column can't be resized,
+        so adding or deleting rows raises a BufferError
+        (use `column(name, as_numpy=True).copy()` for an array that doesn't hold on to the column)
+        @return the column holding the values of the slot for all rows: an `array.array` or a list
+        """
+        column = self._columns[name]
+        if not as_numpy:
+            return column
+        if numpy is None:
+            raise ImportError("as_numpy needs numpy")
+        if isinstance(column, list):
+            return numpy.array(column, dtype=object)
+        return numpy.frombuffer(column, dtype=bool if name in self._bools else column.typecode)
+
+    def columns(self) -> Dict[str, Any]:
+        """!
+        @return all columns by slot name, see ::column
+        """
+        return dict(self._columns)
@@ -1,42 +1,151 @@
 """!
 some additional (math) types you may need, with instance checks
 """
+from array import array
+from functools import lru_cache
+from typing import Any, Iterable, Optional
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-__all__ = ["NaturalNumber", "StrictNaturalNumber"]
 
+__all__ = ["NaturalNumber", "StrictNaturalNumber", "BoundedInt"]
 
-class NaturalNumberMeta(type):
+## @cond
+_INT_TYPECODES = frozenset("bBhHiIlLqQ")
+_INT_FORMATS = frozenset("bBhHiIlLqQnN")
+
+
+class _IntRangeMeta(type):
     """!
-    metaclass
+    metaclass of integer types bounded by `__low__` and `__high__` (None for no bound),
+    with checks of whole sequences at once
     """
 
+    __low__: Optional[int] = None
+    __high__: Optional[int] = None
+
     def __instancecheck__(self, instance):
         """!
         Checks whether the argument is an instance of the type
         @param instance the object to test
         @return the number matches the criteria
         """
-        return isinstance(instance, int) and instance >= 0
+        return (
+            isinstance(instance, int)
+            and (self.__low__ is None or instance >= self.__low__)
+            and (self.__high__ is None or instance <= self.__high__)
+        )
 
+    def _in_bounds(self, low: int, high: int) -> bool:
+        return (self.__low__ is None or low >= self.__low__) and (self.__high__ is None or high <= self.__high__)
+
+    def _integer_buffer(self, values: Any) -> Optional[Iterable[int]]:
+        """!
+        @return `values` if it is a buffer of integers (whose elements are all ints), else None
+        """
+        if isinstance(values, array) and values.typecode in _INT_TYPECODES:
+            return values
+        if isinstance(values, memoryview) and values.format in _INT_FORMATS and values.ndim == 1:
+            return values
+        return None
+
+    def _numpy_mask(self, values: Any) -> Any:
+        mask = numpy.ones(values.shape, dtype=bool)
+        if self.__low__ is not None:
+            mask &= values >= self.__low__
+        if self.__high__ is not None:
+            mask &= values <= self.__high__
+        return mask
+
+    def all(self, values: Iterable) -> bool:
+        """!
+        Checks whether every element of `values` is an instance of the type.
+
+        NumPy arrays of an integer (or bool) dtype are checked by value, with vectorized comparisons;
+        arrays of other dtypes only if they hold objects. Integer `array.array`s and memoryviews
+        are checked by their minimum and maximum, and so are lists and tuples that only hold ints.
+
+        @param values the objects to test
+        @return whether all of them match the criteria
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            if values.dtype.kind in "iub":
+                return bool(self._numpy_mask(values).all())
+            if values.dtype.kind != "O":
+                return values.size == 0
+            return all(map(self.__instancecheck__, values.flat))
+        buffer = self._integer_buffer(values)
+        if buffer is not None:
+            return len(buffer) == 0 or self._in_bounds(min(buffer), max(buffer))
+        if isinstance(values, (list, tuple)):
+            types = set(map(type, values))
+            if types <= {int, bool} or all(issubclass(t, int) for t in types):
+                return len(values) == 0 or self._in_bounds(min(values), max(values))
+            return False
+        return all(map(self.__instancecheck__, values))
 
-class StrictNaturalNumberMeta(type):
+    def mask(self, values: Iterable) -> Any:
+        """!
+        Checks each element of `values`, see ::all.
+
+        @param values the objects to test
+        @return a boolean NumPy array of the shape of `values` if it is an array, else a list of bools
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            if values.dtype.kind in "iub":
+                return self._numpy_mask(values)
+            if values.dtype.kind != "O":
+                return numpy.zeros(values.shape, dtype=bool)
+            return numpy.frompyfunc(self.__instancecheck__, 1, 1)(values).astype(bool)
+        return list(map(self.__instancecheck__, values))
+
+    def first_violation(self, values: Iterable) -> Optional[int]:
+        """!
+        Finds the first element of `values` that isn't an instance of the type, see ::all.
+
+        @param values the objects to test
+        @return its index (in the flattened array for NumPy arrays), or None if all elements match
+        """
+        if numpy is not None and isinstance(values, numpy.ndarray):
+            bad = numpy.flatnonzero(~self.mask(values))
+            return int(bad[0]) if bad.size else None
+        if self._integer_buffer(values) is not None or isinstance(values, (list, tuple)):
+            if self.all(values):
+                return None
+        for i, value in enumerate(values):
+            if not self.__instancecheck__(value):
+                return i
+        return None
+
+
+## @endcond
+
+
+class NaturalNumberMeta(_IntRangeMeta):
     """!
     metaclass
     """
 
-    def __instancecheck__(self, instance):
-        """!
-        Checks whether the argument is an instance of the type
-        @param instance the object to test
-        @return the number matches the criteria
-        """
-        return isinstance(instance, int) and instance >= 1
+    __low__ = 0
+
+
+class StrictNaturalNumberMeta(_IntRangeMeta):
+    """!
+    metaclass
+    """
+
+    __low__ = 1
 
 
 class NaturalNumber(metaclass=NaturalNumberMeta):
     """!
     A natural number is any non-negative integer
+
+    `NaturalNumber.all(values)`, `NaturalNumber.mask(values)` and `NaturalNumber.first_violation(values)`
+    check many values at once, vectorized for NumPy arrays and buffers.
     """
 
     pass
@@ -45,6 +154,36 @@ class NaturalNumber(metaclass=NaturalNumberMeta):
 class StrictNaturalNumber(metaclass=StrictNaturalNumberMeta):
     """!
     A strict natural number is any integer bigger than 0
+
+    Has the same bulk checks as ::NaturalNumber.
+    """
+
+    pass
+
+
+## @cond
+class _BoundedIntMeta(type):
+    @lru_cache(None)
+    def __getitem__(self, bounds) -> type:
+        low, high = bounds
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"empty range: {low} > {high}")
+        meta = type("BoundedIntMeta", (_IntRangeMeta,), {"__low__": low, "__high__": high})
+        return meta(f"BoundedInt[{low}, {high}]", (), {"__doc__": f"An integer from {low} to {high}"})
+
+
+## @endcond
+
+
+class BoundedInt(metaclass=_BoundedIntMeta):
+    """!
+    A family of integer types with bounds, like `BoundedInt[0, 65535]` (inclusive; None for no bound).
+
+    Instance checks work like those of ::NaturalNumber, including the bulk checks:
+    ```py
+    isinstance(80, BoundedInt[0, 65535])  # True
+    BoundedInt[0, 255].all(array('q', [1, 2, 300]))  # False
+    ```
     """
 
     pass
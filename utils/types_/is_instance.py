@@ -1,18 +1,388 @@
 """!
 Contains a function that extends standard isinstance.
 """
-from typing import Union, get_origin, get_args, Tuple, Any
+import collections.abc
+from collections import OrderedDict
+import re
+from abc import ABCMeta
+from functools import lru_cache
+from itertools import islice
+from random import randrange
+from typing import (
+    Any,
+    Callable,
+    Literal,
+    Tuple,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+)
 
-__all__ = ['is_instance']
+try:
+    from types import UnionType
+except ImportError:  # Python < 3.10
+    UnionType = Union
 
-def is_instance(obj: Any, types: Union[type, Tuple[type]]) -> bool:
+try:
+    from types import GenericAlias
+except ImportError:  # Python < 3.9
+    GenericAlias = ()
+
+try:
+    from typing import Annotated
+except ImportError:  # Python < 3.9
+    # a stand-in no origin is
+    Annotated = object()
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['is_instance', 'compile_check']
+
+## @cond
+_FULL = -1
+_SHALLOW = 0
+# the python types that elements of arrays of a dtype kind behave like
+_DTYPE_KINDS = {'b': bool, 'i': int, 'u': int, 'f': float, 'c': complex, 'U': str, 'S': bytes}
+_TYPE_CHECKS = {type.__instancecheck__, ABCMeta.__instancecheck__}
+
+
+@lru_cache(None)
+def _parse_depth(depth: str) -> int:
+    if depth == "full":
+        return _FULL
+    if depth == "shallow":
+        return _SHALLOW
+    match = re.fullmatch(r"sample\((\d+)\)", depth)
+    if match is None or int(match[1]) < 1:
+        raise ValueError(
+            f"invalid check depth {depth!r}, expected 'shallow', 'full' or 'sample(k)' with k > 0"
+        )
+    return int(match[1])
+
+
+def _sample(obj, k: int):
+    """!
+    @return k elements of a collection, chosen randomly for sequences and the first ones otherwise
+    (only sequences can be indexed in constant time)
+    """
+    if isinstance(obj, collections.abc.Sequence):
+        n = len(obj)
+        return [obj[randrange(n)] for _ in range(k)] if n else ()
+    return islice(obj, k)
+
+
+def _always(obj) -> bool:
+    return True
+
+
+def _is_none(obj) -> bool:
+    return obj is None
+
+
+def _is_class(annotation) -> bool:
+    # on Python 3.9 and 3.10, `list[int]` passes isinstance(..., type), but can't be used with isinstance
+    return isinstance(annotation, type) and not isinstance(annotation, GenericAlias)
+
+
+def _is_plain_class(annotation) -> bool:
+    # classes whose instance check only depends on the type of the object, so that checking them
+    # is exactly isinstance (also used by strict and overload)
+    return _is_class(annotation) and type(annotation).__instancecheck__ in _TYPE_CHECKS
+
+
+def _any_of(predicates: list, classes: tuple = ()) -> Callable[[Any], bool]:
+    """!
+    Combines predicates with `or`, checking all plain classes with a single isinstance first.
+    """
+    if not predicates:
+        return lambda obj: isinstance(obj, classes)
+    if not classes and len(predicates) == 1:
+        return predicates[0]
+
+    def check(obj) -> bool:
+        if isinstance(obj, classes):
+            return True
+        for predicate in predicates:
+            if predicate(obj):
+                return True
+        return False
+
+    return check
+
+
+def _compile_union(types, depth: int) -> Callable[[Any], bool]:
+    classes, predicates = [], []
+    for t in types:
+        if t is None:
+            t = type(None)
+        if _is_plain_class(t):
+            classes.append(t)
+        else:
+            predicates.append(_compile(t, depth))
+    return _any_of(predicates, tuple(classes))
+
+
+def _compile_literal(values: tuple) -> Callable[[Any], bool]:
+    # type and value, so that True doesn't match Literal[1]
+    try:
+        allowed = frozenset((type(v), v) for v in values)
+    except TypeError:
+        return lambda obj: any(type(obj) is type(v) and obj == v for v in values)
+
+    def check(obj) -> bool:
+        try:
+            return (type(obj), obj) in allowed
+        except TypeError:
+            return False
+
+    return check
+
+
+def _compile_subclass(types) -> Callable[[type], bool]:
+    if types is Any:
+        return _always
+    if get_origin(types) in {Union, UnionType}:
+        classes = tuple(get_origin(t) or t for t in get_args(types))
+    else:
+        classes = get_origin(types) or types
+    return lambda cls: issubclass(cls, classes)
+
+
+def _compile_ndarray(args: tuple) -> Callable[[Any], bool]:
+    """!
+    Checks `numpy.ndarray[shape, numpy.dtype[scalar]]` (like `numpy.typing.NDArray[scalar]`)
+    by looking at the array's dtype and number of dimensions only.
+    """
+    shape, dtype = args if len(args) == 2 else (Any, Any)
+    ndim = None
+    if get_origin(shape) is tuple and Ellipsis not in get_args(shape):
+        ndim = len(get_args(shape))
+    scalars = get_args(dtype)
+    scalar = scalars[0] if scalars and scalars[0] is not Any else None
+
+    def check(obj) -> bool:
+        return (
+            isinstance(obj, numpy.ndarray)
+            and (ndim is None or obj.ndim == ndim)
+            and (scalar is None or numpy.issubdtype(obj.dtype, scalar))
+        )
+
+    return check
+
+
+def _compile_elements(element, depth: int) -> Callable[[Any], bool]:
     """!
-    A wrapper around isinstance that has support for subscripted Unions
-    
+    @return a predicate checking the elements of a (non-mapping) collection
+    """
+    check_element = _compile(element, depth)
+    element_class = element if _is_plain_class(element) else None
+    # types like NaturalNumber check whole collections at once, see utils.types_
+    check_all = None
+    if _is_class(element) and element_class is None:
+        check_all = getattr(type(element), 'all', None)
+    if check_all is not None and depth == _FULL:
+        return check_all.__get__(element)
+
+    def check(obj) -> bool:
+        if numpy is not None and element_class is not None and isinstance(obj, numpy.ndarray):
+            # arrays are checked by their dtype instead of element by element
+            if obj.dtype.kind == 'O':
+                return all(map(check_element, obj.flat))
+            kind = _DTYPE_KINDS.get(obj.dtype.kind)
+            return kind is not None and issubclass(kind, element_class)
+        if depth == _FULL:
+            return all(map(check_element, obj))
+        return all(map(check_element, _sample(obj, depth)))
+
+    return check
+
+
+def _compile_container(origin, args: tuple, depth: int) -> Callable[[Any], bool]:
+    if depth == _SHALLOW or not args:
+        return lambda obj: isinstance(obj, origin)
+
+    if origin is tuple:
+        if len(args) == 2 and args[1] is Ellipsis:
+            check_elements = _compile_elements(args[0], depth)
+            return lambda obj: isinstance(obj, tuple) and check_elements(obj)
+        if args == ((),):
+            return lambda obj: isinstance(obj, tuple) and len(obj) == 0
+        predicates = tuple(_compile(t, depth) for t in args)
+        return lambda obj: (
+            isinstance(obj, tuple)
+            and len(obj) == len(predicates)
+            and all(p(v) for p, v in zip(predicates, obj))
+        )
+
+    if isinstance(origin, type) and issubclass(origin, collections.abc.Mapping):
+        key_type, value_type = args if len(args) == 2 else (args[0], Any)
+        check_key = _compile(key_type, depth)
+        check_value = _compile(value_type, depth)
+
+        def check_mapping(obj) -> bool:
+            if not isinstance(obj, origin):
+                return False
+            keys = obj.keys() if depth == _FULL else _sample(obj.keys(), depth)
+            return all(check_key(k) and check_value(obj[k]) for k in keys)
+
+        return check_mapping
+
+    check_elements = _compile_elements(args[0], depth)
+
+    def check(obj) -> bool:
+        if not isinstance(obj, origin):
+            return False
+        # iterating one-shot iterators would consume them, so only collections are checked deeply
+        if isinstance(obj, collections.abc.Collection) and not isinstance(
+            obj, collections.abc.Iterator
+        ):
+            return check_elements(obj)
+        return True
+
+    return check
+
+
+def _compile(types, depth: int) -> Callable[[Any], bool]:
+    if types is Any:
+        return _always
+    if types is None:
+        return _is_none
+    if isinstance(types, tuple):
+        return _compile_union(types, depth)
+    if _is_class(types):
+        if _is_plain_class(types):
+            return lambda obj: isinstance(obj, types)
+        # a metaclass with its own instance check, like NaturalNumber's: call it directly
+        return type(types).__instancecheck__.__get__(types)
+    if isinstance(types, TypeVar):
+        if types.__bound__ is not None:
+            return _compile(types.__bound__, depth)
+        return _compile_union(types.__constraints__, depth) if types.__constraints__ else _always
+    if hasattr(types, '__supertype__'):  # NewType
+        return _compile(types.__supertype__, depth)
+
+    origin = get_origin(types)
+    if origin is None:
+        # let isinstance decide (or raise) at call time
+        return lambda obj: isinstance(obj, types)
+    args = get_args(types)
+    if origin is Union or origin is UnionType:
+        return _compile_union(args, depth)
+    if origin is Literal:
+        return _compile_literal(args)
+    if origin is Annotated:
+        return _compile(args[0], depth)
+    if origin is collections.abc.Callable:
+        # the signature can't be checked without calling
+        return callable
+    if origin is type:
+        is_subclass = _compile_subclass(args[0]) if args else _always
+        return lambda obj: isinstance(obj, type) and is_subclass(obj)
+    if numpy is not None and origin is numpy.ndarray:
+        return _compile_ndarray(args)
+    return _compile_container(origin, args, depth)
+
+
+## id(annotation) -> (annotation, {depth: predicate}), least recently used first
+#
+# Keyed by identity, since hashing annotations like `Union[int, str]` costs more than checking them.
+# The entry holds the annotation (as its predicates do anyway), so its id can't be reused while it is cached;
+# the number of entries is bounded instead, so that classes created at runtime are eventually freed.
+# Annotations that are recreated every time they are evaluated (like tuples or `int | str`,
+# which can't be weakly referenced either) are cached by ::_compile_by_value instead.
+_predicates = OrderedDict()
+
+## the most annotation objects whose predicates are kept by identity
+_BY_IDENTITY_SIZE = 4096
+
+## the most annotations whose predicates are kept by value
+_BY_VALUE_SIZE = 1024
+
+
+@lru_cache(_BY_VALUE_SIZE)
+def _compile_by_value(types: Any, depth: str) -> Callable[[Any], bool]:
+    # keyed by equality, since a new `int | str` is created every time the expression is evaluated
+    return _compile(types, _parse_depth(depth))
+
+
+## @endcond
+
+
+def compile_check(types: Any, depth: str = "full") -> Callable[[Any], bool]:
+    """!
+    Compiles an annotation into a predicate that checks whether an object matches it, like ::is_instance does.
+
+    The predicate is built once per annotation object and depth, and cached for the 4096 most recently used
+    annotation objects (annotations recreated on every evaluation, like tuples and `int | str`, are cached by value,
+    up to 1024 of them):
+    `Union`s of plain classes become one isinstance check against a tuple, custom instance checks like
+    `NaturalNumber`'s are called directly, and containers check their elements with their own compiled predicates.
+
+    ## Example:
+    ```py
+    check = compile_check(dict[str, list[int]])
+    check({'a': [1, 2]})  # True
+    ```
+
+    @param types a type, annotation or tuple of them
+    @param depth how deeply to check containers, see ::is_instance
+    @return a callable taking an object and returning whether it matches
+    """
+    key = id(types)
+    try:
+        predicate = _predicates[key][1][depth]
+        _predicates.move_to_end(key)
+        return predicate
+    except KeyError:
+        pass
+    if not type(types).__weakrefoffset__:
+        try:
+            return _compile_by_value(types, depth)
+        except TypeError:  # unhashable, like a tuple holding a list
+            return _compile(types, _parse_depth(depth))
+    predicate = _compile(types, _parse_depth(depth))
+    entry = _predicates.get(key)
+    if entry is None:
+        entry = _predicates[key] = (types, {})
+        if len(_predicates) > _BY_IDENTITY_SIZE:
+            _predicates.popitem(last=False)
+    entry[1][depth] = predicate
+    return predicate
+
+
+def is_instance(obj: Any, types: Union[type, Tuple[type]], depth: str = "full") -> bool:
+    """!
+    A wrapper around isinstance that has support for subscripted types
+
+    Besides plain types, it understands `Union` (and `X | Y`), `Optional`, `Literal`, `Any`, `Annotated`,
+    `type[X]`, `Callable` (which is only checked for being callable), `TypeVar`s and `NewType`s,
+    and subscripted containers like `list[int]`, `dict[str, float]`, `tuple[int, ...]` or `tuple[int, str]`.
+
+    `depth` selects how much of a container is checked:
+    - `"shallow"`: only the container itself (`list[int]` checks for a list)
+    - `"sample(k)"`: k randomly chosen elements (the first k for unordered collections)
+    - `"full"`: every element
+
+    Iterators are never iterated, since that would consume them; NumPy arrays are checked by their dtype
+    (and, for `numpy.typing.NDArray`-style annotations, their number of dimensions) instead of element by element.
+    Fully checked containers of `NaturalNumber`s, `BoundedInt`s and the like are checked in one pass
+    by their bulk check (see `NaturalNumber.all`).
+
+    The checks are compiled once per annotation, see ::compile_check.
+
+    ## Example:
+    ```py
+    is_instance([1, 2, 'x'], list[int])  # False
+    is_instance([1, 2, 'x'], list[int], depth="shallow")  # True
+    is_instance({'a': 1.0}, dict[str, float])  # True
+    ```
+
     @param obj the object to test
     @param types a type or a tuple of types
-    """    
-    if get_origin(types) is Union:
-        return is_instance(obj, get_args(types))
-    
-    return isinstance(obj, types)
+    @param depth how deeply to check containers
+    """
+    return compile_check(types, depth)(obj)